@@ -1,18 +1,56 @@
-
 import os
-from typing import Dict
+from typing import Dict, Iterator
 from google.generativeai import configure
 import google.generativeai as genai
+from agents.llm_cache import get_llm_cache
+
+PROMPT_VERSION = 'explainer-v1'
+
+REVIEW_WARNING = "\n\n⚠️ Note: The verifier has some concerns about this solution. Please review carefully."
 
 class ExplainerAgent:
     def __init__(self):
         configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('models/gemini-2.0-flash-lite')
+        self.model_name = 'models/gemini-2.0-flash-lite'
+        self.model = genai.GenerativeModel(self.model_name)
 
     def explain(self, parsed_problem: Dict, solution: Dict, verification: Dict) -> Dict:
+        prompt, inputs = self._build_prompt(parsed_problem, solution)
+        is_correct = verification.get('is_correct', False)
+
+        explanation, cache_status = get_llm_cache().generate(
+            self.model, self.model_name, PROMPT_VERSION, inputs, prompt
+        )
+
+        if not is_correct:
+            explanation += REVIEW_WARNING
+
+        return self._build_result(explanation, is_correct, cache_status)
+
+    def explain_stream(self, parsed_problem: Dict, solution: Dict, verification: Dict) -> Iterator[Dict]:
+        # Yields {'delta': text} as the explanation is generated, then a final
+        # {'result': ...} identical to what explain() returns.
+        prompt, inputs = self._build_prompt(parsed_problem, solution)
+        is_correct = verification.get('is_correct', False)
+
+        cache_status, chunks = get_llm_cache().stream(
+            self.model, self.model_name, PROMPT_VERSION, inputs, prompt
+        )
+
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield {'delta': chunk}
+
+        if not is_correct:
+            parts.append(REVIEW_WARNING)
+            yield {'delta': REVIEW_WARNING}
+
+        yield {'result': self._build_result(''.join(parts), is_correct, cache_status)}
+
+    def _build_prompt(self, parsed_problem: Dict, solution: Dict):
         problem_text = parsed_problem.get('problem_text', '')
         solution_text = solution.get('solution', '')
-        is_correct = verification.get('is_correct', False)
 
         prompt = f"""You are a friendly math tutor. Explain this solution in a student-friendly way.
 
@@ -31,14 +69,12 @@ Make it conversational and encouraging.
 
 """
 
-        response = self.model.generate_content(prompt)
-        explanation = response.text
-
-        if not is_correct:
-            explanation += "\n\n⚠️ Note: The verifier has some concerns about this solution. Please review carefully."
+        return prompt, {'problem_text': problem_text, 'solution': solution_text}
 
+    def _build_result(self, explanation: str, is_correct: bool, cache_status: str) -> Dict:
         return {
             'explanation': explanation,
             'tone': 'friendly',
-            'includes_warnings': not is_correct
-        }
\ No newline at end of file
+            'includes_warnings': not is_correct,
+            'cache': cache_status
+        }
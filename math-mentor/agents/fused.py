@@ -0,0 +1,124 @@
+import os
+import json
+from typing import Dict, List, Optional
+from google.generativeai import configure
+import google.generativeai as genai
+from pydantic import BaseModel, Field, ValidationError
+from agents.llm_cache import get_llm_cache
+from agents.explainer import REVIEW_WARNING
+
+PROMPT_VERSION = 'fused-v1'
+
+class FusedVerification(BaseModel):
+    is_correct: bool
+    confidence: float = Field(ge=0.0, le=1.0)
+    issues: List[str] = []
+    needs_review: bool
+    feedback: str
+
+class FusedResponse(BaseModel):
+    solution: str = Field(min_length=1)
+    final_answer: str = Field(min_length=1)
+    verification: FusedVerification
+    explanation: str = Field(min_length=1)
+
+class FusedSolverAgent:
+    # Low-latency tier: one structured-output request returns the solution, its
+    # verification and the student explanation, instead of three sequential calls
+    # that each resend the problem and solution. solve() returns None when the
+    # response does not match FusedResponse, and the caller falls back to the
+    # separate solver, verifier and explainer.
+    def __init__(self, solver):
+        configure(api_key=os.getenv('GEMINI_API_KEY'))
+        self.model_name = 'models/gemini-2.0-flash-lite'
+        self.model = genai.GenerativeModel(
+            self.model_name,
+            generation_config={'response_mime_type': 'application/json'}
+        )
+        self.solver = solver
+
+    def solve(self, parsed_problem: Dict, context: Dict, strategy: str) -> Optional[Dict]:
+        problem_text = parsed_problem.get('problem_text', '')
+        topic = parsed_problem.get('topic', '')
+        kb_context = context.get('knowledge_base', [])
+        similar_problems = context.get('similar_problems', [])
+        context_text = self.solver.format_context(kb_context, similar_problems)
+
+        prompt = f"""You are a math tutor. Solve the problem, check your own solution, then explain it to a student.
+
+Problem: {problem_text}
+Topic: {topic}
+Strategy: {strategy}
+
+Relevant Knowledge:
+{context_text}
+
+Respond with a single JSON object with exactly these fields:
+{{
+  "solution": "numbered step-by-step solution",
+  "final_answer": "the final answer only, e.g. x = 5",
+  "verification": {{
+    "is_correct": true/false,
+    "confidence": 0.0-1.0,
+    "issues": ["list of issues if any"],
+    "needs_review": true/false,
+    "feedback": "brief feedback"
+  }},
+  "explanation": "friendly explanation: the approach, why each step works, key concepts and common mistakes"
+}}
+
+Check the solution independently of how you produced it: substitute the answer back, check units, domains and edge cases.
+Respond with ONLY valid JSON."""
+
+        inputs = {'problem_text': problem_text, 'topic': topic, 'strategy': strategy, 'context': context_text}
+        response_text, cache_status = get_llm_cache().generate(
+            self.model, self.model_name, PROMPT_VERSION, inputs, prompt,
+            validate=self._is_valid_response
+        )
+
+        response = self._parse_response(response_text)
+        if response is None:
+            return None
+
+        solution_text = f"{response.solution.rstrip()}\n\nFinal Answer: {response.final_answer}"
+        solution = self.solver.build_result(solution_text, len(kb_context) + len(similar_problems), cache_status)
+        solution['method'] = 'fused'
+        solution['answer'] = response.final_answer
+
+        verification = response.verification.model_dump()
+        if verification['confidence'] < 0.7:
+            verification['needs_review'] = True
+        verification['cache'] = cache_status
+        verification['method'] = 'fused'
+
+        return {
+            'solution': solution,
+            'verification': verification,
+            'explanation': response.explanation,
+            'cache': cache_status
+        }
+
+    def explanation(self, fused: Dict, verification: Dict) -> Dict:
+        # Same shape as ExplainerAgent.explain; the warning follows the final
+        # verification, which may be a numeric check rather than the model's own.
+        is_correct = verification.get('is_correct', False)
+        return {
+            'explanation': fused['explanation'] + ('' if is_correct else REVIEW_WARNING),
+            'tone': 'friendly',
+            'includes_warnings': not is_correct,
+            'cache': fused['cache']
+        }
+
+    def _is_valid_response(self, response_text: str) -> bool:
+        return self._parse_response(response_text) is not None
+
+    def _parse_response(self, response_text: str) -> Optional[FusedResponse]:
+        response_text = (response_text or '').strip()
+        if response_text.startswith('```'):
+            response_text = response_text.split('```')[1]
+            if response_text.startswith('json'):
+                response_text = response_text[4:]
+        try:
+            return FusedResponse.model_validate(json.loads(response_text))
+        except (json.JSONDecodeError, ValidationError):
+            return None
@@ -0,0 +1,78 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from utils.cache import DiskCache, LRUCache, TieredCache
+
+def normalize_input(value):
+    if isinstance(value, str):
+        return re.sub(r'\s+', ' ', value).strip()
+    if isinstance(value, dict):
+        return {k: normalize_input(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_input(v) for v in value]
+    return value
+
+def make_cache_key(model_name: str, template_version: str, inputs: Dict) -> str:
+    payload = json.dumps({
+        'model': model_name,
+        'template': template_version,
+        'inputs': normalize_input(inputs)
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class LLMResponseCache:
+    def __init__(self, disk_path: Optional[str] = 'data/llm_cache.sqlite', memory_entries: int = 512,
+                 disk_entries: int = 20000, ttl: float = 7 * 24 * 3600):
+        disk = DiskCache(disk_path, max_entries=disk_entries, ttl=ttl) if disk_path else None
+        self.cache = TieredCache(LRUCache(max_entries=memory_entries, ttl=ttl), disk)
+
+    def generate(self, model, model_name: str, template_version: str, inputs: Dict, prompt: str,
+                 validate: Optional[Callable[[str], bool]] = None) -> Tuple[str, str]:
+        # Returns (response_text, 'hit' | 'miss'). Responses failing validate are
+        # returned but not cached, so a malformed answer is retried next time.
+        key = make_cache_key(model_name, template_version, inputs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached, 'hit'
+
+        text = model.generate_content(prompt).text
+        if validate is None or validate(text):
+            self.cache.set(key, text)
+        return text, 'miss'
+
+    def stream(self, model, model_name: str, template_version: str, inputs: Dict, prompt: str) -> Tuple[str, Iterator[str]]:
+        # Returns ('hit' | 'miss', chunks). A hit yields the cached text at once; a
+        # miss streams from the model and caches the response once it completes.
+        key = make_cache_key(model_name, template_version, inputs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return 'hit', iter([cached])
+
+        def chunks():
+            parts = []
+            for chunk in model.generate_content(prompt, stream=True):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. a bare finish reason).
+                    continue
+                parts.append(text)
+                yield text
+            self.cache.set(key, ''.join(parts))
+
+        return 'miss', chunks()
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMResponseCache:
+    global _llm_cache
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                disk_path = os.getenv('LLM_CACHE_PATH', 'data/llm_cache.sqlite')
+                _llm_cache = LLMResponseCache(disk_path=disk_path or None)
+    return _llm_cache
@@ -4,14 +4,26 @@ import json
 from typing import Dict
 # from google.generativeai import configure
 import google.generativeai as genai
+from agents.llm_cache import get_llm_cache
+from utils.rule_parser import CONFIDENCE_THRESHOLD, RuleBasedParser
+
+PROMPT_VERSION = 'parser-v1'
 
 class ParserAgent:
     def __init__(self):
         # configure(api_key=os.getenv('GEMINI_API_KEY'))
         genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('models/gemini-2.0-flash-lite')
+        self.model_name = 'models/gemini-2.0-flash-lite'
+        self.model = genai.GenerativeModel(self.model_name)
+        self.rules = RuleBasedParser()
 
     def parse(self, raw_text: str, input_type: str = 'text') -> Dict:
+        # Well-formed expressions and equations are parsed locally; anything the
+        # rules are unsure about goes to the LLM. 'parser_path' records which.
+        local = self.rules.parse(raw_text)
+        if local is not None and local['parser_confidence'] >= CONFIDENCE_THRESHOLD:
+            return {**local, 'parser_path': 'rules', 'cache': None}
+
         prompt = f"""You are a math problem parser. Convert the following {input_type} input into a structured format.
 
 Input: {raw_text}
@@ -25,16 +37,16 @@ Analyze and provide a JSON response with:
 
 Respond with ONLY valid JSON, no other text."""
 
-        response = self.model.generate_content(prompt)
-        response_text = response.text.strip()
+        response_text, cache_status = get_llm_cache().generate(
+            self.model, self.model_name, PROMPT_VERSION,
+            {'raw_text': raw_text, 'input_type': input_type}, prompt,
+            validate=self._is_valid_response
+        )
 
         try:
-            if response_text.startswith('```json'):
-                response_text = response_text.split('```json')[1].split('```')[0].strip()
-            elif response_text.startswith('```'):
-                response_text = response_text.split('```')[1].split('```')[0].strip()
-
-            parsed = json.loads(response_text)
+            parsed = self._extract_json(response_text)
+            parsed['cache'] = cache_status
+            parsed['parser_path'] = 'llm'
             return parsed
         except json.JSONDecodeError:
             return {
@@ -42,5 +54,21 @@ Respond with ONLY valid JSON, no other text."""
                 'topic': 'unknown',
                 'variables': [],
                 'constraints': [],
-                'needs_clarification': True
-            }
\ No newline at end of file
+                'needs_clarification': True,
+                'cache': cache_status,
+                'parser_path': 'llm'
+            }
+
+    def _extract_json(self, response_text: str) -> Dict:
+        response_text = response_text.strip()
+        if response_text.startswith('```json'):
+            response_text = response_text.split('```json')[1].split('```')[0].strip()
+        elif response_text.startswith('```'):
+            response_text = response_text.split('```')[1].split('```')[0].strip()
+        return json.loads(response_text)
+
+    def _is_valid_response(self, response_text: str) -> bool:
+        try:
+            return isinstance(self._extract_json(response_text), dict)
+        except json.JSONDecodeError:
+            return False
\ No newline at end of file
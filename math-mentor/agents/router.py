@@ -3,6 +3,7 @@ import os
 from typing import Dict
 from google.generativeai import configure
 import google.generativeai as genai
+from utils.math_engine import STRATEGY as SYMBOLIC_STRATEGY, get_math_engine
 
 class RouterAgent:
     def __init__(self):
@@ -39,6 +40,11 @@ class RouterAgent:
     def _determine_strategy(self, problem: Dict) -> str:
         topic = problem.get('topic', '')
         
+        # Problems the math engine solves exactly skip the LLM solver; the result
+        # is memoised, so the solver reuses this computation.
+        if get_math_engine().solve(problem) is not None:
+            return SYMBOLIC_STRATEGY
+        
         strategies = {
             'algebra': 'algebraic_manipulation',
             'probability': 'counting_and_probability',
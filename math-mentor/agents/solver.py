@@ -1,32 +1,99 @@
 import os
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional
 import re
-import ast
-import operator
 from google.generativeai import configure
 import google.generativeai as genai
+from agents.llm_cache import get_llm_cache
+from utils.expression import ExpressionEngine
+from utils.math_engine import STRATEGY as SYMBOLIC_STRATEGY, get_math_engine
+
+PROMPT_VERSION = 'solver-v2'
 
 class SolverAgent:
     def __init__(self):
         configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('models/gemini-2.0-flash-lite')
-        self.operators = {
-            ast.Add: operator.add,
-            ast.Sub: operator.sub,
-            ast.Mult: operator.mul,
-            ast.Div: operator.truediv,
-            ast.Pow: operator.pow,
-            ast.USub: operator.neg,
-        }
+        self.model_name = 'models/gemini-2.0-flash-lite'
+        self.model = genai.GenerativeModel(self.model_name)
+        self.calculator = ExpressionEngine()
+        self.engine = get_math_engine()
     
     def solve(self, parsed_problem: Dict, context: Dict, strategy: str) -> Dict:
+        local = self._solve_locally(parsed_problem, strategy)
+        if local is not None:
+            return local
+        
+        prompt, inputs, context_used = self._build_prompt(parsed_problem, context, strategy)
+        
+        solution, cache_status = get_llm_cache().generate(self.model, self.model_name, PROMPT_VERSION, inputs, prompt)
+        
+        return self.build_result(solution, context_used, cache_status)
+    
+    def solve_stream(self, parsed_problem: Dict, context: Dict, strategy: str) -> Iterator[Dict]:
+        # Yields {'delta': text} as the response arrives, with each CALCULATE result
+        # inserted as soon as its line completes, then a final {'result': ...}
+        # identical to what solve() returns.
+        local = self._solve_locally(parsed_problem, strategy)
+        if local is not None:
+            yield {'delta': local['solution']}
+            yield {'result': local}
+            return
+        
+        prompt, inputs, context_used = self._build_prompt(parsed_problem, context, strategy)
+        
+        cache_status, chunks = get_llm_cache().stream(self.model, self.model_name, PROMPT_VERSION, inputs, prompt)
+        
+        raw_parts = []
+        output_parts = []
+        line = ''
+        for chunk in chunks:
+            raw_parts.append(chunk)
+            pieces = chunk.split('\n')
+            for i, piece in enumerate(pieces):
+                line += piece
+                if i < len(pieces) - 1:
+                    deltas = [piece + '\n'] + [result + '\n' for result in self._calculation_results(line)]
+                    line = ''
+                elif piece:
+                    deltas = [piece]
+                else:
+                    continue
+                for delta in deltas:
+                    output_parts.append(delta)
+                    yield {'delta': delta}
+        
+        for result in self._calculation_results(line):
+            output_parts.append('\n' + result)
+            yield {'delta': '\n' + result}
+        
+        yield {'result': self._build_result(''.join(raw_parts), ''.join(output_parts), context_used, cache_status)}
+    
+    def _solve_locally(self, parsed_problem: Dict, strategy: str) -> Optional[Dict]:
+        # Exact answer from the math engine when the router picked it; None falls
+        # back to the LLM (the strategy is still passed on as a hint).
+        if strategy != SYMBOLIC_STRATEGY:
+            return None
+        solved = self.engine.solve(parsed_problem)
+        if solved is None:
+            return None
+        return {
+            'solution': solved['solution'],
+            'steps': solved['steps'],
+            'context_used': 0,
+            'calculations_performed': 0,
+            'cache': None,
+            'method': 'symbolic',
+            'task': solved['task'],
+            'answer': solved['answer']
+        }
+    
+    def _build_prompt(self, parsed_problem: Dict, context: Dict, strategy: str):
         problem_text = parsed_problem.get('problem_text', '')
         topic = parsed_problem.get('topic', '')
         
         kb_context = context.get('knowledge_base', [])
         similar_problems = context.get('similar_problems', [])
         
-        context_text = self._format_context(kb_context, similar_problems)
+        context_text = self.format_context(kb_context, similar_problems)
         
         prompt = f"""You are a math problem solver with access to a Python calculator tool.
 
@@ -40,6 +107,10 @@ Relevant Knowledge:
 Solve step-by-step. When you need to calculate something, write it as:
 CALCULATE: <expression>
 Example: CALCULATE: (2 + 3) * 4
+Available functions: sqrt, exp, log, ln, sin, cos, tan, asin, acos, atan, factorial, comb, perm, gcd, lcm, abs, floor, ceil, round
+To tabulate a function over a range, write it as:
+CALCULATE: <expression> for x in range(start, stop, step)
+Example: CALCULATE: x**2 - 3*x for x in linspace(0, 2, 5)
 
 Provide:
 1. Understanding of the problem
@@ -47,17 +118,23 @@ Provide:
 3. Final answer
 
 Format each step clearly."""
-
-        response = self.model.generate_content(prompt)
-        solution = response.text
-        
-        solution_with_calcs = self._execute_calculations(solution)
         
+        inputs = {'problem_text': problem_text, 'topic': topic, 'strategy': strategy, 'context': context_text}
+        return prompt, inputs, len(kb_context) + len(similar_problems)
+    
+    def build_result(self, solution: str, context_used: int, cache_status: str) -> Dict:
+        # Runs the CALCULATE lines of a complete solution text and returns the
+        # solver's result dict; also used by FusedSolverAgent.
+        return self._build_result(solution, self._execute_calculations(solution), context_used, cache_status)
+    
+    def _build_result(self, solution: str, solution_with_calcs: str, context_used: int, cache_status: str) -> Dict:
         return {
             'solution': solution_with_calcs,
             'steps': self._extract_steps(solution_with_calcs),
-            'context_used': len(kb_context) + len(similar_problems),
-            'calculations_performed': solution.count('CALCULATE:')
+            'context_used': context_used,
+            'calculations_performed': solution.count('CALCULATE:'),
+            'cache': cache_status,
+            'method': 'llm'
         }
     
     def _execute_calculations(self, solution: str) -> str:
@@ -66,56 +143,24 @@ Format each step clearly."""
         
         for line in lines:
             result_lines.append(line)
-            if 'CALCULATE:' in line:
-                expr = line.split('CALCULATE:')[1].strip()
-                try:
-                    result = self._safe_eval(expr)
-                    result_lines.append(f"  → Result: {result}")
-                except Exception as e:
-                    result_lines.append(f"  → Calculation error: {str(e)}")
+            result_lines.extend(self._calculation_results(line))
         
         return '\n'.join(result_lines)
     
-    def _safe_eval(self, expr: str):
+    def _calculation_results(self, line: str) -> List[str]:
+        if 'CALCULATE:' not in line:
+            return []
+        expr = line.split('CALCULATE:')[1].strip()
         try:
-            expr = expr.replace('^', '**').replace('√', 'sqrt')
-            
-            allowed_names = {
-                'sqrt': lambda x: x ** 0.5,
-                'abs': abs,
-                'pow': pow,
-                'pi': 3.141592653589793,
-                'e': 2.718281828459045
-            }
-            
-            node = ast.parse(expr, mode='eval')
-            
-            def _eval(node):
-                if isinstance(node, ast.Expression):
-                    return _eval(node.body)
-                elif isinstance(node, ast.Num):
-                    return node.n
-                elif isinstance(node, ast.BinOp):
-                    left = _eval(node.left)
-                    right = _eval(node.right)
-                    return self.operators[type(node.op)](left, right)
-                elif isinstance(node, ast.UnaryOp):
-                    operand = _eval(node.operand)
-                    return self.operators[type(node.op)](operand)
-                elif isinstance(node, ast.Call):
-                    func_name = node.func.id
-                    args = [_eval(arg) for arg in node.args]
-                    return allowed_names[func_name](*args)
-                elif isinstance(node, ast.Name):
-                    return allowed_names[node.id]
-                else:
-                    raise ValueError(f"Unsupported operation: {type(node)}")
-            
-            return _eval(node.body)
+            result = self._safe_eval(expr)
+            return [f"  → Result: {result}"]
         except Exception as e:
-            raise ValueError(f"Cannot evaluate: {expr}")
+            return [f"  → Calculation error: {str(e)}"]
+    
+    def _safe_eval(self, expr: str):
+        return self.calculator.calculate(expr)
     
-    def _format_context(self, kb_results: List[Dict], similar: List[Dict]) -> str:
+    def format_context(self, kb_results: List[Dict], similar: List[Dict]) -> str:
         parts = []
         
         for i, result in enumerate(kb_results, 1):
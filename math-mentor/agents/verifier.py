@@ -4,13 +4,25 @@ from typing import Dict
 import json
 from google.generativeai import configure
 import google.generativeai as genai
+from agents.llm_cache import get_llm_cache
+from utils.answer_check import AnswerChecker
+
+PROMPT_VERSION = 'verifier-v1'
 
 class VerifierAgent:
     def __init__(self):
         configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('models/gemini-2.0-flash-lite')
+        self.model_name = 'models/gemini-2.0-flash-lite'
+        self.model = genai.GenerativeModel(self.model_name)
+        self.checker = AnswerChecker()
     
     def verify(self, parsed_problem: Dict, solution: Dict) -> Dict:
+        # A deterministic numeric check decides when it can; the LLM is only asked
+        # when that check is inconclusive.
+        local = self.checker.check(parsed_problem, solution)
+        if local is not None:
+            return local
+        
         problem_text = parsed_problem.get('problem_text', '')
         solution_text = solution.get('solution', '')
         
@@ -38,20 +50,20 @@ Respond with JSON:
 
 Respond with ONLY valid JSON."""
 
-        response = self.model.generate_content(prompt)
-        response_text = response.text.strip()
+        response_text, cache_status = get_llm_cache().generate(
+            self.model, self.model_name, PROMPT_VERSION,
+            {'problem_text': problem_text, 'solution': solution_text}, prompt,
+            validate=self._is_valid_response
+        )
 
         try:
-            if response_text.startswith('```json'):
-                response_text = response_text.split('```json')[1].split('```')[0].strip()
-            elif response_text.startswith('```'):
-                response_text = response_text.split('```')[1].split('```')[0].strip()
-
-            verification = json.loads(response_text)
+            verification = self._extract_json(response_text)
 
             if verification.get('confidence', 0) < 0.7:
                 verification['needs_review'] = True
 
+            verification['cache'] = cache_status
+            verification['method'] = 'llm'
             return verification
         except json.JSONDecodeError:
             return {
@@ -59,5 +71,21 @@ Respond with ONLY valid JSON."""
                 'confidence': 0.5,
                 'issues': ['Unable to verify solution'],
                 'needs_review': True,
-                'feedback': 'Verification inconclusive'
-            }
\ No newline at end of file
+                'feedback': 'Verification inconclusive',
+                'cache': cache_status,
+                'method': 'llm'
+            }
+
+    def _extract_json(self, response_text: str) -> Dict:
+        response_text = response_text.strip()
+        if response_text.startswith('```json'):
+            response_text = response_text.split('```json')[1].split('```')[0].strip()
+        elif response_text.startswith('```'):
+            response_text = response_text.split('```')[1].split('```')[0].strip()
+        return json.loads(response_text)
+
+    def _is_valid_response(self, response_text: str) -> bool:
+        try:
+            return isinstance(self._extract_json(response_text), dict)
+        except json.JSONDecodeError:
+            return False
\ No newline at end of file
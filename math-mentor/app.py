@@ -6,47 +6,32 @@
 import streamlit as st
 from PIL import Image
 import os
+import re
+import asyncio
 from dotenv import load_dotenv
 
 # Compatibility fix for Pillow 10.0.0+ where ANTIALIAS was removed
 if not hasattr(Image, 'ANTIALIAS'):
     Image.ANTIALIAS = Image.LANCZOS
 
-from utils.ocr import OCRProcessor
-from utils.audio import AudioProcessor
-from utils.memory import MemorySystem
 from utils.hitl import HITLSystem
-from agents.parser import ParserAgent
-from agents.router import RouterAgent
-from agents.solver import SolverAgent
-from agents.verifier import VerifierAgent
-from agents.explainer import ExplainerAgent
-from rag.retriever import Retriever
+from utils.registry import registry
+from utils.audio import LOW_WORD_PROBABILITY
+from pipeline.solve import build_solve_pipeline
 
 load_dotenv()
 
 st.set_page_config(page_title="Math Mentor", page_icon="📐", layout="wide")
 
-if 'memory' not in st.session_state:
-    st.session_state.memory = MemorySystem()
+def escape_markdown(text: str) -> str:
+    # Transcribed maths ("x^2", "a*b", "$5") must not be read as markdown or LaTeX.
+    return re.sub(r'([\\`*_{}\[\]()#+\-.!|$^~<>:])', r'\\\1', text)
+
+# Models, agents and the retriever are process-wide and shared by every session,
+# and each is only built when something first needs it; only the HITL trigger
+# history is kept per session.
 if 'hitl' not in st.session_state:
     st.session_state.hitl = HITLSystem()
-if 'ocr' not in st.session_state:
-    st.session_state.ocr = OCRProcessor()
-if 'audio' not in st.session_state:
-    st.session_state.audio = AudioProcessor()
-if 'parser' not in st.session_state:
-    st.session_state.parser = ParserAgent()
-if 'router' not in st.session_state:
-    st.session_state.router = RouterAgent()
-if 'solver' not in st.session_state:
-    st.session_state.solver = SolverAgent()
-if 'verifier' not in st.session_state:
-    st.session_state.verifier = VerifierAgent()
-if 'explainer' not in st.session_state:
-    st.session_state.explainer = ExplainerAgent()
-if 'retriever' not in st.session_state:
-    st.session_state.retriever = Retriever()
 
 st.title("📐 Math Mentor - AI Problem Solver")
 st.markdown("Upload an image, record audio, or type your math problem")
@@ -55,6 +40,11 @@ col1, col2 = st.columns([2, 1])
 
 with col1:
     input_mode = st.radio("Input Mode", ["Text", "Image", "Audio"], horizontal=True)
+    # Start loading the model for this mode while the user picks a file.
+    if input_mode == "Image":
+        registry.warm_up(['media_cache', 'ocr'])
+    elif input_mode == "Audio":
+        registry.warm_up(['media_cache', 'audio'])
     
     extracted_text = ""
     needs_review = False
@@ -72,7 +62,10 @@ with col1:
             st.image(image, caption="Uploaded Image", use_column_width=True)
             
             with st.spinner("Extracting text from image..."):
-                result = st.session_state.ocr.extract_text(image)
+                result = registry.get('media_cache').get_or_compute(
+                    uploaded_file.getvalue(), 'ocr', registry.get('ocr').cache_version,
+                    lambda: registry.get('ocr').extract_text(image)
+                )
                 extracted_text = result['text']
                 ocr_confidence = result['confidence']
                 needs_review = result['needs_review']
@@ -86,6 +79,12 @@ with col1:
                 else:
                     st.success("✅ High Confidence")
             
+            if result.get('cached'):
+                st.caption("⚡ Reused OCR result for this image")
+            elif result.get('timings'):
+                with st.expander(f"⏱️ OCR timings ({sum(result['timings'].values()):.2f}s)", expanded=False):
+                    st.json({stage: round(seconds, 3) for stage, seconds in result['timings'].items()})
+            
             extracted_text = st.text_area("Extracted Text (edit if needed):", value=extracted_text, height=150)
             
     elif input_mode == "Audio":
@@ -93,8 +92,23 @@ with col1:
         if audio_file:
             st.audio(audio_file)
             
+            partial_transcript = st.empty()
+
+            def transcribe_audio():
+                # Show each chunk's text as soon as Whisper finishes it.
+                heard = []
+                for event in registry.get('audio').transcribe_stream(audio_file):
+                    if 'result' in event:
+                        partial_transcript.empty()
+                        return event['result']
+                    heard.append(event['delta'])
+                    partial_transcript.caption(f"🎙️ {' '.join(heard)}▌")
+
             with st.spinner("Transcribing audio..."):
-                result = st.session_state.audio.transcribe(audio_file)
+                result = registry.get('media_cache').get_or_compute(
+                    audio_file.getvalue(), 'audio', registry.get('audio').cache_version,
+                    transcribe_audio
+                )
                 extracted_text = result['text']
                 audio_confidence = result['confidence']
                 needs_review = result['needs_review']
@@ -108,8 +122,31 @@ with col1:
                 else:
                     st.success("✅ High Confidence")
             
+            if result.get('duration'):
+                st.caption(f"Transcribed {result['speech_duration']:.1f}s of speech from a {result['duration']:.1f}s clip")
+            
+            if result.get('low_confidence_spans'):
+                # Words Whisper was unsure of are shown in red, with their position in the clip.
+                # Whisper words carry their leading space, which must stay outside the
+                # markup: "** word**" is not bold.
+                highlighted = ''.join(
+                    (' ' if word['word'][:1].isspace() else '') + f":red[**{escape_markdown(word['word'].strip())}**]"
+                    if word['probability'] < LOW_WORD_PROBABILITY
+                    else escape_markdown(word['word'])
+                    for word in result['words']
+                )
+                st.markdown(f"Check the highlighted words: {highlighted}")
+                st.caption(" · ".join(
+                    f"\"{span['text'].strip()}\" at {span['start']:.1f}s ({span['confidence']:.0%})"
+                    for span in result['low_confidence_spans']
+                ))
+            
             extracted_text = st.text_area("Transcription (edit if needed):", value=extracted_text, height=150)
     
+    # One LLM call for solution, verification and explanation instead of three;
+    # falls back to the separate agents if the combined response is malformed.
+    fused_mode = st.checkbox("⚡ Low-latency mode (single LLM call)", value=os.getenv('SOLVE_MODE', '').lower() == 'fused')
+    
     col_btn1, col_btn2 = st.columns(2)
     with col_btn1:
         solve_button = st.button("🚀 Solve Problem", type="primary", disabled=not extracted_text, use_container_width=True)
@@ -121,88 +158,124 @@ with col2:
     trace_container = st.container()
 
 if solve_button and extracted_text:
-    final_text = st.session_state.get("edited_text", extracted_text)
+    extracted_text = registry.get('memory').apply_learned_corrections(extracted_text, input_mode.lower())
     
-    # Then use final_text for parsing
-    parsed = st.session_state.parser.parse(final_text, input_mode.lower())
-    extracted_text = st.session_state.memory.apply_learned_corrections(extracted_text, input_mode.lower())
+    if input_mode == "Image" and extracted_text != result['text']:
+        ocr_confidence = 1.0
+    if input_mode == "Audio" and extracted_text != result['text']:
+        audio_confidence = 1.0
     
     with trace_container:
         trace = []
+        stage_labels = {
+            'parse': "🔍 **Parser Agent**: Analyzing problem...",
+            'route': "🧭 **Router Agent**: Determining strategy...",
+            'retrieve': "🔎 **Retriever**: Fetching relevant context...",
+            'solve': "💡 **Solver Agent**: Solving problem...",
+            'verify': "✅ **Verifier Agent**: Checking solution...",
+            'explain': "📚 **Explainer Agent**: Creating explanation...",
+        }
+        if fused_mode:
+            stage_labels['fuse'] = "⚡ **Solver Agent**: Solving, checking and explaining in one call..."
         
-        st.write("🔍 **Parser Agent**: Analyzing problem...")
-        parsed = st.session_state.parser.parse(extracted_text, input_mode.lower())
-        trace.append({"agent": "Parser", "output": parsed})
-        with st.expander("Parser Output", expanded=False):
-            st.json(parsed)
-        
-        if input_mode == "Image" and extracted_text != result['text']:
-            ocr_confidence = 1.0
-        if input_mode == "Audio" and extracted_text != result['text']:
-            audio_confidence = 1.0
-
-        hitl_check = st.session_state.hitl.should_trigger_hitl(
-            ocr_confidence=ocr_confidence,
-            audio_confidence=audio_confidence,
-            parser_needs_clarification=parsed.get('needs_clarification', False),
-            explicit_request=False
-        )
-        
-        if hitl_check['should_trigger']:
-            st.error(st.session_state.hitl.get_hitl_instructions(hitl_check))
-            st.session_state.hitl_triggered = True
-            st.stop()
-        
-        st.write("🧭 **Router Agent**: Determining strategy...")
-        routing = st.session_state.router.route(parsed)
-        trace.append({"agent": "Router", "output": routing})
-        with st.expander("Router Output", expanded=False):
-            st.json(routing)
-        
-        if routing.get('requires_hitl'):
-            st.error(f"❗ HITL Required: {routing.get('reason')}")
-            st.info("Please clarify your problem or edit the extracted text.")
-            st.stop()
+        # Solver and explainer output is rendered progressively while it streams,
+        # then cleared once the full result is shown in the tabs below.
+        streams = {}
         
-        st.write("🔎 **Retriever**: Fetching relevant context...")
-        context = st.session_state.retriever.retrieve_context(parsed)
-        trace.append({"agent": "Retriever", "sources": len(context['knowledge_base'])})
-        st.write(f"📚 Retrieved {len(context['knowledge_base'])} knowledge chunks + {len(context['similar_problems'])} similar problems")
+        def on_stage_start(name):
+            if name in stage_labels:
+                st.write(stage_labels[name])
+            if name in ('solve', 'explain'):
+                streams[name] = {'placeholder': st.empty(), 'text': ''}
         
-        st.write("💡 **Solver Agent**: Solving problem...")
-        solution = st.session_state.solver.solve(parsed, context, routing['strategy'])
-        trace.append({"agent": "Solver", "steps": len(solution['steps'])})
-        if solution.get('calculations_performed', 0) > 0:
-            st.write(f"🧮 Performed {solution['calculations_performed']} calculations")
+        def on_stage_event(name, delta):
+            stream = streams.get(name)
+            if stream is not None:
+                stream['text'] += delta
+                stream['placeholder'].markdown(stream['text'] + " ▌")
         
-        st.write("✅ **Verifier Agent**: Checking solution...")
-        verification = st.session_state.verifier.verify(parsed, solution)
-        trace.append({"agent": "Verifier", "output": verification})
+        def on_stage_end(name, output, elapsed):
+            if name in streams:
+                streams.pop(name)['placeholder'].empty()
+            if name == 'parse':
+                trace.append({"agent": "Parser", "output": output, "cache": output.get('cache'), "path": output.get('parser_path'), "seconds": elapsed})
+                if output.get('parser_path') == 'rules':
+                    st.write("⚡ Parsed locally by the rule-based parser")
+                with st.expander("Parser Output", expanded=False):
+                    st.json(output)
+            elif name == 'route':
+                trace.append({"agent": "Router", "output": output, "seconds": elapsed})
+                with st.expander("Router Output", expanded=False):
+                    st.json(output)
+            elif name == 'retrieve':
+                trace.append({"agent": "Retriever", "sources": len(output['knowledge_base']), "seconds": elapsed})
+                st.write(f"📚 Retrieved {len(output['knowledge_base'])} knowledge chunks + {len(output['similar_problems'])} similar problems")
+            elif name == 'fuse':
+                if output is not None:
+                    trace.append({"agent": "Fused", "cache": output.get('cache'), "seconds": elapsed})
+                elif fused_mode:
+                    st.write("↩️ Using separate solver, verifier and explainer")
+            elif name == 'solve':
+                trace.append({"agent": "Solver", "steps": len(output['steps']), "cache": output.get('cache'), "seconds": elapsed})
+                if output.get('method') == 'symbolic':
+                    st.write("🧮 Solved exactly by the local math engine")
+                if output.get('cache') == 'hit':
+                    st.write("⚡ Solver response served from cache")
+                if output.get('calculations_performed', 0) > 0:
+                    st.write(f"🧮 Performed {output['calculations_performed']} calculations")
+            elif name == 'verify':
+                trace.append({"agent": "Verifier", "output": output, "cache": output.get('cache'), "seconds": elapsed})
+                if output.get('method') == 'numeric':
+                    st.write(f"🔢 Answer checked numerically ({output.get('points_checked', 0)} evaluations)")
+                with st.expander("Verifier Output", expanded=False):
+                    st.json(output)
+            elif name == 'review':
+                if output['should_trigger']:
+                    st.warning("⚠️ Verifier has concerns. Solution generated but needs review.")
+            elif name == 'explain':
+                trace.append({"agent": "Explainer", "cache": output.get('cache'), "seconds": elapsed})
         
-        verifier_hitl = st.session_state.hitl.should_trigger_hitl(
-            verifier_confidence=verification.get('confidence', 1.0)
+        pipeline = build_solve_pipeline(
+            registry.get('parser'),
+            registry.get('router'),
+            registry.get('retriever'),
+            registry.get('solver'),
+            registry.get('verifier'),
+            registry.get('explainer'),
+            st.session_state.hitl,
+            fused=registry.get('fused_solver') if fused_mode else None
         )
+        run = asyncio.run(pipeline.run({
+            'text': extracted_text,
+            'input_type': input_mode.lower(),
+            'ocr_confidence': ocr_confidence,
+            'audio_confidence': audio_confidence
+        }, on_stage_start=on_stage_start, on_stage_end=on_stage_end, on_stage_event=on_stage_event))
         
-        if verifier_hitl['should_trigger']:
-            st.warning("⚠️ Verifier has concerns. Solution generated but needs review.")
-        
-        with st.expander("Verifier Output", expanded=False):
-            st.json(verification)
+        if run.halted:
+            if run.halted.stage == 'input_check':
+                st.error(run.halted.reason)
+                st.session_state.hitl_triggered = True
+            else:
+                st.error(f"❗ HITL Required: {run.halted.reason}")
+                st.info("Please clarify your problem or edit the extracted text.")
+            st.stop()
         
-        st.write("📚 **Explainer Agent**: Creating explanation...")
-        explanation = st.session_state.explainer.explain(parsed, solution, verification)
+        with st.expander(f"⏱️ Timings: {run.wall_time:.2f}s end-to-end ({run.stage_time:.2f}s of stage work)", expanded=False):
+            st.json({name: round(timing['duration'], 3) for name, timing in run.timings.items()})
         
         st.session_state.current_solution = {
             'input_mode': input_mode,
             'original_text': extracted_text,
-            'parsed': parsed,
-            'routing': routing,
-            'solution': solution,
-            'verification': verification,
-            'explanation': explanation,
-            'context': context,
+            'parsed': run.outputs['parse'],
+            'routing': run.outputs['route'],
+            'solution': run.outputs['solve'],
+            'verification': run.outputs['verify'],
+            'explanation': run.outputs['explain'],
+            'context': run.outputs['retrieve'],
             'trace': trace,
-            'hitl_data': verifier_hitl
+            'timings': run.timings,
+            'hitl_data': run.outputs['review']
         }
 
 if recheck_button and extracted_text:
@@ -264,7 +337,7 @@ if 'current_solution' in st.session_state:
                 st.warning(issue)
     
     with tab4:
-        insights = st.session_state.memory.get_learning_insights()
+        insights = registry.get('memory').get_learning_insights()
         
         col_i1, col_i2, col_i3 = st.columns(3)
         with col_i1:
@@ -290,7 +363,7 @@ if 'current_solution' in st.session_state:
     
     with col_fb1:
         if st.button("✅ Correct Solution", use_container_width=True):
-            st.session_state.memory.store({
+            registry.get('memory').store({
                 'input_type': st.session_state.current_solution['input_mode'],
                 'original_text': st.session_state.current_solution['original_text'],
                 'parsed_question': st.session_state.current_solution['parsed'],
@@ -319,7 +392,7 @@ if 'current_solution' in st.session_state:
         col_submit, col_cancel = st.columns(2)
         with col_submit:
             if st.button("Submit Feedback", type="primary", use_container_width=True):
-                st.session_state.memory.store({
+                registry.get('memory').store({
                     'input_type': st.session_state.current_solution['input_mode'],
                     'original_text': st.session_state.current_solution['original_text'],
                     'parsed_question': st.session_state.current_solution['parsed'],
@@ -340,7 +413,7 @@ if 'current_solution' in st.session_state:
                 st.rerun()
 
 st.sidebar.title("📊 System Statistics")
-insights = st.session_state.memory.get_learning_insights()
+insights = registry.get('memory').get_learning_insights()
 
 st.sidebar.metric("Problems Solved", insights['total_problems'])
 if insights['total_problems'] > 0:
@@ -361,4 +434,12 @@ st.sidebar.info("""
 - Learns from your feedback
 - Improves OCR/audio corrections
 - Identifies successful strategies
-""")
\ No newline at end of file
+""")
+
+# Once the page has rendered, load the text-solving path in the background.
+# WARM_UP=all also preloads EasyOCR and Whisper; WARM_UP=none disables it.
+warm_up_mode = os.getenv('WARM_UP', 'text').lower()
+if warm_up_mode != 'none':
+    registry.warm_up(['memory', 'parser', 'router', 'solver', 'verifier', 'explainer', 'retriever'])
+    if warm_up_mode == 'all':
+        registry.warm_up(['media_cache', 'ocr', 'audio'])
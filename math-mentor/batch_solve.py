@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, Set
+
+from dotenv import load_dotenv
+
+from utils.hitl import HITLSystem
+from utils.registry import registry
+from pipeline.solve import build_solve_pipeline
+from rag.retriever import BatchingRetriever
+
+def read_problems(path: str) -> Iterator[Dict]:
+    # JSONL or CSV rows with a 'text' (or 'problem') field and an optional 'id';
+    # rows without an id are numbered by position so reruns line up.
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    for i, row in enumerate(rows):
+        text = row.get('text') or row.get('problem') or ''
+        # An id of 0 is an id; only a missing one (or an empty CSV cell) is replaced.
+        problem_id = row.get('id')
+        yield {
+            'id': str(i if problem_id is None or problem_id == '' else problem_id),
+            'text': text.strip(),
+            'input_type': row.get('input_type') or 'text'
+        }
+
+def read_checkpoint(path: str, retry_errors: bool) -> Set[str]:
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of a run that crashed mid-write.
+                continue
+            if retry_errors and record.get('status') == 'error':
+                continue
+            done.add(record['id'])
+    return done
+
+class RateLimiter:
+    # Spaces out pipeline starts to at most `per_minute` across all workers.
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+async def solve_problem(problem: Dict, fused: bool = False, retriever=None) -> Dict:
+    record = {'id': problem['id'], 'problem': problem['text']}
+
+    try:
+        # Building the agents can fail too (e.g. a missing API key); that is
+        # recorded against the problem rather than aborting the batch.
+        pipeline = build_solve_pipeline(
+            registry.get('parser'),
+            registry.get('router'),
+            retriever if retriever is not None else registry.get('retriever'),
+            registry.get('solver'),
+            registry.get('verifier'),
+            registry.get('explainer'),
+            HITLSystem(),
+            fused=registry.get('fused_solver') if fused else None
+        )
+        run = await pipeline.run({
+            'text': problem['text'],
+            'input_type': problem['input_type'],
+            'ocr_confidence': 1.0,
+            'audio_confidence': 1.0
+        })
+    except Exception as e:
+        record.update({'status': 'error', 'error': f"{type(e).__name__}: {e}"})
+        return record
+
+    outputs = run.outputs
+    record.update({
+        'status': 'needs_review' if run.halted else 'solved',
+        'parsed': outputs.get('parse'),
+        'routing': outputs.get('route'),
+        'solution': outputs.get('solve'),
+        'verification': outputs.get('verify'),
+        'explanation': outputs.get('explain'),
+        'timings': {name: round(t['duration'], 3) for name, t in run.timings.items()},
+        'wall_time': round(run.wall_time, 3)
+    })
+    if run.halted:
+        record['review_reason'] = run.halted.reason
+    return record
+
+async def run_batch(args) -> Dict[str, int]:
+    done = read_checkpoint(args.output, args.retry_errors)
+    problems = [p for p in read_problems(args.input) if p['text']]
+    skipped = sum(p['id'] in done for p in problems)
+    problems = [p for p in problems if p['id'] not in done]
+    counts = {'skipped': skipped, 'solved': 0, 'needs_review': 0, 'error': 0}
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    # Workers that reach retrieval together share one batched knowledge-base and
+    # memory lookup.
+    retriever = BatchingRetriever(lambda: registry.get('retriever'), max_batch=args.concurrency)
+    limiter = RateLimiter(args.rate)
+
+    with open(args.output, 'a', encoding='utf-8') as out:
+        if out.tell() > 0:
+            with open(args.output, 'rb') as existing:
+                existing.seek(-1, os.SEEK_END)
+                if existing.read(1) != b'\n':
+                    # Terminate a line left partial by a crash so new records parse.
+                    out.write('\n')
+
+        async def worker(problem: Dict):
+            async with semaphore:
+                await limiter.wait()
+                record = await solve_problem(problem, args.fused, retriever)
+            # Each record is flushed as it completes, so the output file doubles as
+            # the checkpoint: rerunning the same command resumes after a crash.
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            os.fsync(out.fileno())
+            counts[record['status']] += 1
+            print(f"[{record['status']}] {record['id']}", file=sys.stderr)
+
+        await asyncio.gather(*(worker(problem) for problem in problems))
+
+    return counts
+
+def main():
+    # Before the parser is built: SOLVE_MODE in .env sets the --fused default.
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Solve a problem set without the Streamlit UI.")
+    parser.add_argument('input', help="JSONL or CSV file with 'id' and 'text' (or 'problem') fields")
+    parser.add_argument('-o', '--output', default='results.jsonl', help="JSONL results file; also used as the resume checkpoint")
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help="Problems solved in parallel")
+    parser.add_argument('-r', '--rate', type=float, default=30, help="Max problems started per minute (0 = unlimited)")
+    parser.add_argument('--retry-errors', action='store_true', help="Re-run problems whose previous result was an error")
+    parser.add_argument('--fused', action='store_true', default=os.getenv('SOLVE_MODE', '').lower() == 'fused',
+                        help="Solve, verify and explain each problem with a single LLM call")
+    args = parser.parse_args()
+
+    counts = asyncio.run(run_batch(args))
+    print(json.dumps(counts), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
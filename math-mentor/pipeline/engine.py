@@ -0,0 +1,128 @@
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class PipelineHalt(Exception):
+    # Raised by a stage to stop the run early (e.g. human review required).
+    def __init__(self, stage: str, reason: str, data: Optional[Dict] = None):
+        super().__init__(reason)
+        self.stage = stage
+        self.reason = reason
+        self.data = data or {}
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[..., Any]
+    deps: Tuple[str, ...] = ()
+
+@dataclass
+class PipelineResult:
+    outputs: Dict[str, Any]
+    timings: Dict[str, Dict[str, float]]
+    wall_time: float
+    halted: Optional[PipelineHalt] = None
+
+    @property
+    def stage_time(self) -> float:
+        return sum(t['duration'] for t in self.timings.values())
+
+@dataclass
+class Pipeline:
+    # A DAG of stages. Each stage is called with the outputs of its deps (and any
+    # run inputs it names) as keyword arguments and starts as soon as they are
+    # ready; synchronous stages run in worker threads so independent stages overlap.
+    stages: List[Stage] = field(default_factory=list)
+
+    def __post_init__(self):
+        names = [stage.name for stage in self.stages]
+        if len(names) != len(set(names)):
+            raise ValueError("Duplicate stage names")
+        # Stages must be listed after their dependencies, which rules out cycles.
+        seen = set()
+        for stage in self.stages:
+            for dep in stage.deps:
+                if dep in names and dep not in seen:
+                    raise ValueError(f"Stage '{stage.name}' depends on '{dep}', which is not defined before it")
+            seen.add(stage.name)
+
+    async def run(self, inputs: Dict[str, Any],
+                  on_stage_start: Optional[Callable[[str], None]] = None,
+                  on_stage_end: Optional[Callable[[str, Any, float], None]] = None,
+                  on_stage_event: Optional[Callable[[str, Any], None]] = None) -> PipelineResult:
+        loop = asyncio.get_running_loop()
+        outputs: Dict[str, Any] = {}
+        timings: Dict[str, Dict[str, float]] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        started = time.perf_counter()
+
+        def make_emitter(name: str):
+            # Stages that accept an 'emit' argument can report partial output (e.g.
+            # streamed text); events are delivered on the event loop's thread.
+            def emit(payload: Any):
+                if on_stage_event is None:
+                    return
+                try:
+                    loop.call_soon_threadsafe(on_stage_event, name, payload)
+                except RuntimeError:
+                    # The run already finished or was halted.
+                    pass
+            return emit
+
+        async def run_stage(stage: Stage):
+            kwargs = {}
+            for dep in stage.deps:
+                if dep in tasks:
+                    kwargs[dep] = await tasks[dep]
+                elif dep in inputs:
+                    kwargs[dep] = inputs[dep]
+                else:
+                    raise KeyError(f"Stage '{stage.name}' is missing input '{dep}'")
+
+            if 'emit' in inspect.signature(stage.func).parameters:
+                kwargs['emit'] = make_emitter(stage.name)
+
+            if on_stage_start:
+                on_stage_start(stage.name)
+            stage_started = time.perf_counter()
+            if inspect.iscoroutinefunction(stage.func):
+                output = await stage.func(**kwargs)
+            else:
+                output = await asyncio.to_thread(stage.func, **kwargs)
+            duration = time.perf_counter() - stage_started
+
+            outputs[stage.name] = output
+            timings[stage.name] = {'start': stage_started - started, 'duration': duration}
+            if on_stage_end:
+                on_stage_end(stage.name, output, duration)
+            return output
+
+        for stage in self.stages:
+            tasks[stage.name] = asyncio.create_task(run_stage(stage))
+
+        halted = None
+        pending = set(tasks.values())
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+                failed = [task for task in done if not task.cancelled() and task.exception() is not None]
+                if failed:
+                    error = failed[0].exception()
+                    if isinstance(error, PipelineHalt):
+                        halted = error
+                        break
+                    raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        return PipelineResult(
+            outputs=outputs,
+            timings=timings,
+            wall_time=time.perf_counter() - started,
+            halted=halted
+        )
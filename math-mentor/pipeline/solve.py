@@ -0,0 +1,84 @@
+from typing import Dict, Optional
+from pipeline.engine import Pipeline, PipelineHalt, Stage
+
+def _consume_stream(events, emit) -> Dict:
+    # Forwards streamed text to the pipeline's event callback and returns the
+    # final result of a solve_stream / explain_stream generator.
+    result = None
+    for event in events:
+        if 'delta' in event:
+            emit(event['delta'])
+        else:
+            result = event['result']
+    return result
+
+def build_solve_pipeline(parser, router, retriever, solver, verifier, explainer, hitl, fused=None) -> Pipeline:
+    # parse -> {input_check, route, retrieve} -> fuse -> solve -> verify -> {review, explain}
+    # Retrieval only needs the parsed problem, so it is prefetched while the HITL
+    # check and routing run; a halt from either discards it.
+    # With a fused agent, solve/verify/explain are read from its single response;
+    # 'fuse' is None when it is disabled, the math engine handles the problem, or
+    # the response was malformed, and the three separate calls run instead.
+    def parse(text: str, input_type: str) -> Dict:
+        return parser.parse(text, input_type)
+
+    def check_input(parse: Dict, ocr_confidence: float, audio_confidence: float) -> Dict:
+        hitl_check = hitl.should_trigger_hitl(
+            ocr_confidence=ocr_confidence,
+            audio_confidence=audio_confidence,
+            parser_needs_clarification=parse.get('needs_clarification', False),
+            explicit_request=False
+        )
+        if hitl_check['should_trigger']:
+            raise PipelineHalt('input_check', hitl.get_hitl_instructions(hitl_check), hitl_check)
+        return hitl_check
+
+    def route(parse: Dict) -> Dict:
+        routing = router.route(parse)
+        if routing.get('requires_hitl'):
+            raise PipelineHalt('route', routing.get('reason', ''), routing)
+        return routing
+
+    def retrieve(parse: Dict) -> Dict:
+        return retriever.retrieve_context(parse)
+
+    def fuse(parse: Dict, route: Dict, retrieve: Dict, input_check: Dict) -> Optional[Dict]:
+        # Imported here: the app imports this module at startup, before SymPy is needed.
+        from utils.math_engine import STRATEGY as SYMBOLIC_STRATEGY
+        if fused is None or route['strategy'] == SYMBOLIC_STRATEGY:
+            return None
+        return fused.solve(parse, retrieve, route['strategy'])
+
+    def solve(parse: Dict, route: Dict, retrieve: Dict, input_check: Dict, fuse: Optional[Dict], emit) -> Dict:
+        if fuse is not None:
+            emit(fuse['solution']['solution'])
+            return fuse['solution']
+        return _consume_stream(solver.solve_stream(parse, retrieve, route['strategy']), emit)
+
+    def verify(parse: Dict, solve: Dict, fuse: Optional[Dict]) -> Dict:
+        if fuse is not None:
+            # A deterministic check still outranks the model grading its own answer.
+            return verifier.checker.check(parse, solve) or fuse['verification']
+        return verifier.verify(parse, solve)
+
+    def review(verify: Dict) -> Dict:
+        return hitl.should_trigger_hitl(verifier_confidence=verify.get('confidence', 1.0))
+
+    def explain(parse: Dict, solve: Dict, verify: Dict, fuse: Optional[Dict], emit) -> Dict:
+        if fuse is not None:
+            result = fused.explanation(fuse, verify)
+            emit(result['explanation'])
+            return result
+        return _consume_stream(explainer.explain_stream(parse, solve, verify), emit)
+
+    return Pipeline([
+        Stage('parse', parse, ('text', 'input_type')),
+        Stage('input_check', check_input, ('parse', 'ocr_confidence', 'audio_confidence')),
+        Stage('route', route, ('parse',)),
+        Stage('retrieve', retrieve, ('parse',)),
+        Stage('fuse', fuse, ('parse', 'route', 'retrieve', 'input_check')),
+        Stage('solve', solve, ('parse', 'route', 'retrieve', 'input_check', 'fuse')),
+        Stage('verify', verify, ('parse', 'solve', 'fuse')),
+        Stage('review', review, ('verify',)),
+        Stage('explain', explain, ('parse', 'solve', 'verify', 'fuse')),
+    ])
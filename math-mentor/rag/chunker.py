@@ -0,0 +1,188 @@
+import hashlib
+import re
+from typing import Dict, List
+
+HEADING = re.compile(r'^(?:#{1,6}\s+(?P<markdown>.+)|(?P<label>[^\s\-*•\d].{0,80}):)$')
+BULLET = re.compile(r'^(?:[-*•]|\d+[.)])\s+')
+EXAMPLE_HEADING = re.compile(r'^(?P<title>(?:worked\s+)?(?:example|problem)s?(?:\s+\d+)?)\s*[:.)]?\s*(?P<rest>.*)$', re.IGNORECASE)
+# Parts of a worked example that must stay with it rather than open a new section.
+EXAMPLE_PART = re.compile(r'^(?:solution|answer|step\s*\d*|check|verification)\b', re.IGNORECASE)
+FENCES = ('```', '$$')
+WORD = re.compile(r'[^\W\d_]{2,}')
+TOKEN = re.compile(r'\w+|[^\w\s]')
+
+def count_tokens(text: str) -> int:
+    return len(TOKEN.findall(text))
+
+def _is_formula(line: str) -> bool:
+    # "x = (-b ± √(b²-4ac)) / 2a" is a formula; "Check dimensions = rows" is prose.
+    stripped = line.strip()
+    if not stripped or BULLET.match(stripped):
+        return False
+    words = WORD.findall(stripped)
+    return bool(re.search(r'[=<>≤≥≠∫∑√^]', stripped)) and len(words) <= max(2, count_tokens(stripped) // 4)
+
+def _is_title(line: str) -> bool:
+    # "LINEAR ALGEBRA FORMULAS" is a title; "- (AB)ᵀ = BᵀAᵀ" is not.
+    return line.isupper() and not BULLET.match(line) and not _is_formula(line) and bool(re.search(r'[^\W\d_]{3,}', line))
+
+class StructuredChunker:
+    # Splits a knowledge document into sections at headings, then into units that
+    # are never cut: a bullet with its indented sub-bullets, a run of formula
+    # lines, a fenced block, a paragraph, or a whole worked example. Units are
+    # packed into chunks of about chunk_tokens, each prefixed by its heading, and
+    # consecutive chunks of a section share up to overlap_tokens of units.
+    def __init__(self, chunk_tokens: int = 200, overlap_tokens: int = 40):
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.name = f'structured:{chunk_tokens}:{overlap_tokens}'
+
+    def chunk(self, content: str, topic: str) -> List[Dict]:
+        chunks = {}
+        for section in self._sections(content):
+            for text in self._pack(section):
+                # Content-addressed: editing one section leaves every other id unchanged.
+                chunk_id = f"{topic}_{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}"
+                chunks[chunk_id] = {
+                    'id': chunk_id,
+                    'text': text,
+                    'heading': section['heading'],
+                    'kind': section['kind']
+                }
+        return list(chunks.values())
+
+    def _sections(self, content: str) -> List[Dict]:
+        sections = []
+        section = {'heading': '', 'kind': 'text', 'units': []}
+        unit = None
+        fence = None
+
+        def close_unit():
+            nonlocal unit
+            if unit is not None:
+                section['units'].append(unit)
+                unit = None
+
+        for raw in content.splitlines():
+            line = raw.rstrip()
+            stripped = line.strip()
+
+            if fence is not None:
+                unit['lines'].append(line)
+                if stripped.startswith(fence) and len(unit['lines']) > 1:
+                    fence = None
+                    close_unit()
+                continue
+
+            in_example = section['kind'] == 'example'
+            if not stripped:
+                if not in_example:
+                    close_unit()
+                elif unit is not None:
+                    unit['lines'].append('')
+                continue
+
+            heading = HEADING.match(stripped) if line == stripped else None
+            example = EXAMPLE_HEADING.match(stripped) if line == stripped else None
+            if in_example and EXAMPLE_PART.match(stripped):
+                heading = example = None
+            if _is_title(stripped) or heading or example:
+                close_unit()
+                if section['units']:
+                    sections.append(section)
+                if example:
+                    # "Example 1: Solve ..." opens an example; the problem statement is its first line.
+                    section = {'heading': example.group('title'), 'kind': 'example', 'units': []}
+                    if example.group('rest'):
+                        unit = {'kind': 'example', 'lines': [example.group('rest')]}
+                    continue
+                title = (heading.group('markdown') or heading.group('label')).strip() if heading else ''
+                section = {'heading': title, 'kind': 'text', 'units': []}
+                continue
+
+            if in_example:
+                # A worked example is one unit from its heading to the next section.
+                if unit is None:
+                    unit = {'kind': 'example', 'lines': []}
+                unit['lines'].append(line)
+                continue
+
+            if any(stripped.startswith(marker) for marker in FENCES):
+                close_unit()
+                unit = {'kind': 'formula', 'lines': [line]}
+                fence = stripped[:3] if stripped.startswith('```') else '$$'
+                if stripped.endswith(fence) and len(stripped) > len(fence):
+                    fence = None
+                    close_unit()
+                continue
+
+            formula = _is_formula(line)
+            if BULLET.match(stripped) and line == stripped:
+                close_unit()
+                unit = {'kind': 'text', 'lines': [line]}
+            elif unit is not None and (line != stripped or unit['kind'] == ('formula' if formula else 'text')):
+                # Indented continuations belong to the bullet above; formula lines stay together.
+                unit['lines'].append(line)
+            else:
+                close_unit()
+                unit = {'kind': 'formula' if formula else 'text', 'lines': [line]}
+
+        close_unit()
+        if section['units']:
+            sections.append(section)
+        for section in sections:
+            for unit in section['units']:
+                while unit['lines'] and not unit['lines'][-1]:
+                    unit['lines'].pop()
+        return sections
+
+    def _pack(self, section: Dict) -> List[str]:
+        prefix = f"{section['heading']}:" if section['heading'] else ''
+        budget = max(1, self.chunk_tokens - count_tokens(prefix))
+
+        units = []
+        for unit in section['units']:
+            units.extend(self._split_oversized('\n'.join(unit['lines']), budget))
+
+        chunks = []
+        current = []
+        size = 0
+        for text, tokens in units:
+            if current and size + tokens > budget:
+                chunks.append(current)
+                # Carry the tail of the previous chunk forward as overlap.
+                carried = []
+                carried_size = 0
+                for previous in reversed(current):
+                    if carried_size + previous[1] > self.overlap_tokens or carried_size + previous[1] + tokens > budget:
+                        break
+                    carried.insert(0, previous)
+                    carried_size += previous[1]
+                current = carried
+                size = carried_size
+            current.append((text, tokens))
+            size += tokens
+        if current:
+            chunks.append(current)
+
+        return ['\n'.join(([prefix] if prefix else []) + [text for text, _ in chunk]) for chunk in chunks]
+
+    def _split_oversized(self, text: str, budget: int) -> List[tuple]:
+        tokens = count_tokens(text)
+        if tokens <= budget:
+            return [(text, tokens)]
+        # Only a unit larger than a whole chunk is cut, and then only between lines.
+        pieces = []
+        current = []
+        size = 0
+        for line in text.split('\n'):
+            line_tokens = count_tokens(line)
+            if current and size + line_tokens > budget:
+                pieces.append(('\n'.join(current), size))
+                current = []
+                size = 0
+            current.append(line)
+            size += line_tokens
+        if current:
+            pieces.append(('\n'.join(current), size))
+        return pieces
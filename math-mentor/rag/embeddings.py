@@ -0,0 +1,179 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+from utils.cache import LRUCache
+
+class Embedder:
+    # Common interface for every backend: embed() returns an L2-normalised float32
+    # matrix, one row per text. `name` identifies the model and its settings; the
+    # knowledge base rebuilds its index whenever it changes. __call__ is the
+    # signature Chroma expects of an embedding function, so chromadb itself is
+    # only needed by the Chroma store.
+    name = 'base'
+    batch_size = 64
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows = [self._embed_batch(list(texts[i:i + self.batch_size])) for i in range(0, len(texts), self.batch_size)]
+        if not rows:
+            return np.zeros((0, 0), dtype=np.float32)
+        return _normalize(np.vstack(rows))
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return self.embed(input).tolist()
+
+class OpenAIEmbedder(Embedder):
+    def __init__(self, model: str = 'text-embedding-3-small', batch_size: int = 256):
+        from openai import OpenAI
+        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.model = model
+        self.batch_size = batch_size
+        self.name = f'openai:{model}'
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        response = self.client.embeddings.create(input=texts, model=self.model)
+        return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+class SentenceTransformerEmbedder(Embedder):
+    # Local CPU model; all-MiniLM-L6-v2 embeds a short query in a few milliseconds.
+    def __init__(self, model_name: str = 'sentence-transformers/all-MiniLM-L6-v2', batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.batch_size = batch_size
+        self.name = f'local:{model_name}'
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True).astype(np.float32)
+
+TOKEN_PATTERN = re.compile(r'[a-z]+|\d+(?:\.\d+)?|[^\sa-z\d]')
+
+class HashingEmbedder(Embedder):
+    # Deterministic, dependency-free fallback: word unigrams/bigrams and character
+    # trigrams hashed into signed buckets. No model to load, no network.
+    def __init__(self, dimension: int = 512):
+        self.dimension = dimension
+        self.batch_size = 1024
+        self.name = f'hashing:{dimension}'
+
+    def _features(self, text: str) -> List[str]:
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        features = tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+        for token in tokens:
+            padded = f'<{token}>'
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+                matrix[row, digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        return matrix
+
+class EmbeddingCache:
+    # Persistent text-hash -> vector store (float32 blobs in SQLite) with an
+    # in-memory LRU in front for repeated queries.
+    def __init__(self, path: Optional[str] = 'data/embedding_cache.sqlite', memory_entries: int = 2048):
+        self.memory = LRUCache(max_entries=memory_entries)
+        self._conn = None
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)')
+            self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> dict:
+        found = {}
+        missing = []
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+            else:
+                missing.append(key)
+
+        if missing and self._conn is not None:
+            with self._lock:
+                for i in range(0, len(missing), 500):
+                    batch = missing[i:i + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        self.memory.set(key, vector)
+                        found[key] = vector
+        return found
+
+    def set_many(self, items: dict):
+        for key, vector in items.items():
+            self.memory.set(key, vector)
+        if self._conn is not None and items:
+            with self._lock:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)',
+                    [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+                )
+                self._conn.commit()
+
+class CachedEmbedder(Embedder):
+    # Wraps any backend; only texts never seen by this model are embedded.
+    def __init__(self, embedder: Embedder, cache: EmbeddingCache):
+        self.embedder = embedder
+        self.cache = cache
+        self.name = embedder.name
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f'{self.name}\0{text}'.encode('utf-8')).hexdigest()
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        keys = [self._key(text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            vectors = self.embedder.embed(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            self.cache.set_many(computed)
+            found.update(computed)
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([found[key] for key in keys])
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+def create_embedder(backend: Optional[str] = None, cache_path: Optional[str] = None) -> Embedder:
+    # EMBEDDING_BACKEND: 'local' (sentence-transformers), 'openai', 'hashing', or
+    # 'auto' (default) which uses the local model when installed and otherwise
+    # the hashing fallback, so retrieval always works offline.
+    backend = (backend or os.getenv('EMBEDDING_BACKEND', 'auto')).lower()
+    if cache_path is None:
+        cache_path = os.getenv('EMBEDDING_CACHE_PATH', 'data/embedding_cache.sqlite')
+
+    if backend == 'openai':
+        embedder = OpenAIEmbedder()
+    elif backend == 'hashing':
+        embedder = HashingEmbedder()
+    else:
+        try:
+            embedder = SentenceTransformerEmbedder(os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2'))
+        except (ImportError, OSError):
+            # OSError: the model is not in the local cache and cannot be downloaded.
+            if backend == 'local':
+                raise
+            embedder = HashingEmbedder()
+
+    return CachedEmbedder(embedder, EmbeddingCache(cache_path or None))
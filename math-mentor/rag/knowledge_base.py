@@ -1,104 +1,181 @@
 import os
+import json
+import hashlib
 from typing import List, Dict
-import openai
-import chromadb
-from chromadb.config import Settings
-from chromadb import EmbeddingFunction
-
-class OpenAIEmbedder(EmbeddingFunction):
-    def __init__(self):
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-    
-    def __call__(self, input: List[str]) -> List[List[float]]:
-        response = openai.Embedding.create(input=input, model="text-embedding-ada-002")
-        return [item['embedding'] for item in response['data']]
+from rag.chunker import StructuredChunker
+from rag.embeddings import Embedder, create_embedder
+from rag.vector_store import create_vector_store
+from utils.cache import LRUCache
+from utils.text_index import STOPWORDS, InvertedIndex, math_tokenize
+
+# Reciprocal rank fusion constant; 60 is the usual choice and keeps one list's
+# top hit from drowning out agreement between both lists.
+RRF_K = 60
+# Below this in-topic lexical coverage the parser's topic may be wrong.
+MIN_TOPIC_COVERAGE = 0.5
+CROSS_TOPIC_WEIGHT = 0.5
 
 class KnowledgeBase:
-    def __init__(self, knowledge_dir='knowledge/docs'):
+    def __init__(self, knowledge_dir='knowledge/docs', persist_dir='data/kb_index', embedder: Embedder = None,
+                 chunker: StructuredChunker = None, vector_store=None):
         self.knowledge_dir = knowledge_dir
-        self.embedder = OpenAIEmbedder()
-        
-        self.client = chromadb.Client(Settings(
-            anonymized_telemetry=False,
-            allow_reset=True
-        ))
-        
-        # Always reset collection to ensure clean state with correct embeddings
-        try:
-            self.client.delete_collection('math_knowledge')
-        except:
-            pass
-        
-        self.collection = self.client.create_collection('math_knowledge', embedding_function=self.embedder)
-        self._load_documents()
-    
-    def _load_documents(self):
-        docs = []
-        metadatas = []
-        ids = []
-        
-        for filename in os.listdir(self.knowledge_dir):
+        self.persist_dir = persist_dir
+        self.manifest_path = os.path.join(persist_dir, 'manifest.json')
+        self.embedder = embedder if embedder is not None else create_embedder()
+        self.chunker = chunker if chunker is not None else StructuredChunker()
+
+        os.makedirs(persist_dir, exist_ok=True)
+        self.store = vector_store if vector_store is not None else create_vector_store(persist_dir, self.embedder)
+        self._query_cache = LRUCache(max_entries=512)
+        self._sync_documents()
+        self._build_lexical_index()
+
+    def _load_manifest(self) -> Dict:
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, OSError):
+                pass
+        return {}
+
+    def _save_manifest(self, manifest: Dict):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _sync_documents(self):
+        # Only files whose content hash changed since the last run are re-chunked;
+        # within those, only chunks not already in the index are embedded.
+        manifest = self._load_manifest()
+        if manifest.get('embedder') != self.embedder.name or manifest.get('store') != self.store.name:
+            # Vectors from another model (or dimension) cannot be mixed in one index.
+            self.store.reset()
+            manifest = {}
+        # A new chunker re-chunks every file; unchanged chunks keep their ids and embeddings.
+        previous = manifest.get('files', {})
+        indexed = previous if manifest.get('chunker') == self.chunker.name else {}
+        current = {}
+
+        for filename in sorted(os.listdir(self.knowledge_dir)):
             if filename.endswith('.txt'):
                 filepath = os.path.join(self.knowledge_dir, filename)
-                topic = filename.replace('.txt', '')
-                
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                chunks = self._chunk_document(content)
-                
-                for i, chunk in enumerate(chunks):
-                    docs.append(chunk)
-                    metadatas.append({
-                        'topic': topic,
-                        'source': filename
-                    })
-                    ids.append(f"{topic}_{i}")
-        
-        if docs:
-            self.collection.add(
-                documents=docs,
-                metadatas=metadatas,
-                ids=ids
+                with open(filepath, 'rb') as f:
+                    raw = f.read()
+
+                file_hash = hashlib.sha256(raw).hexdigest()
+                current[filename] = file_hash
+
+                if indexed.get(filename) != file_hash:
+                    self._index_file(filename, raw.decode('utf-8'))
+
+        for filename in set(previous) - set(current):
+            self.store.delete_source(filename)
+
+        self.store.flush()
+        if current != indexed or not manifest:
+            self._save_manifest({
+                'embedder': self.embedder.name,
+                'store': self.store.name,
+                'chunker': self.chunker.name,
+                'files': current
+            })
+
+    def _build_lexical_index(self):
+        # The BM25 side mirrors the vector store, partitioned by topic.
+        # Coverage ignores stopwords, so "of a" cannot make an off-topic match look good.
+        self.lexical_index = InvertedIndex(tokenizer=math_tokenize, stopwords=STOPWORDS)
+        self.chunks: Dict[str, Dict] = {}
+        for chunk_id, document, metadata in self.store.get_all():
+            self.chunks[chunk_id] = {'content': document, 'metadata': metadata}
+            self.lexical_index.add(chunk_id, document, partition=metadata.get('topic', ''))
+        self._query_cache.clear()
+
+    def _index_file(self, filename: str, content: str):
+        topic = filename.replace('.txt', '')
+        chunks = {chunk['id']: chunk for chunk in self.chunker.chunk(content, topic)}
+
+        existing_ids = self.store.ids_for_source(filename)
+
+        stale_ids = list(existing_ids - set(chunks))
+        if stale_ids:
+            self.store.delete(stale_ids)
+
+        new_ids = [chunk_id for chunk_id in chunks if chunk_id not in existing_ids]
+        if new_ids:
+            self.store.add(
+                documents=[chunks[chunk_id]['text'] for chunk_id in new_ids],
+                metadatas=[
+                    {'topic': topic, 'source': filename, 'heading': chunks[chunk_id]['heading'], 'kind': chunks[chunk_id]['kind']}
+                    for chunk_id in new_ids
+                ],
+                ids=new_ids
             )
-    
-    def _chunk_document(self, content: str, chunk_size: int = 500) -> List[str]:
-        lines = content.split('\n')
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for line in lines:
-            line_size = len(line)
-            if current_size + line_size > chunk_size and current_chunk:
-                chunks.append('\n'.join(current_chunk))
-                current_chunk = [line]
-                current_size = line_size
-            else:
-                current_chunk.append(line)
-                current_size += line_size
-        
-        if current_chunk:
-            chunks.append('\n'.join(current_chunk))
-        
-        return chunks
-    
+
     def search(self, query: str, topic: str = None, k: int = 3) -> List[Dict]:
-        where = {"topic": topic} if topic else None
-        
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=k,
-            where=where
-        )
-        
-        retrieved = []
-        if results['documents']:
-            for i, doc in enumerate(results['documents'][0]):
-                retrieved.append({
-                    'content': doc,
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i] if 'distances' in results else 0
-                })
-        
-        return retrieved
\ No newline at end of file
+        return self.search_many([query], [topic], k)[0]
+
+    def search_many(self, queries: List[str], topics: List[str], k: int = 3) -> List[List[Dict]]:
+        # Hybrid retrieval: BM25 over math-aware tokens and dense similarity,
+        # fused by reciprocal rank. If the topic looks wrong, other topics are
+        # searched too. A batch shares one embedding call and one vector query
+        # per topic, and one pass over the BM25 index.
+        # No topic ('' from a parse without one, or None) means all topics, on
+        # both the lexical and the vector side.
+        topics = [topic or None for topic in topics]
+        cache_keys = [f"{topic or ''}\0{k}\0{' '.join(query.split())}" for query, topic in zip(queries, topics)]
+        results: List[List[Dict]] = [self._query_cache.get(key) for key in cache_keys]
+        pending = [i for i, cached in enumerate(results) if cached is None]
+
+        if pending:
+            ranked = self._hybrid_rank([queries[i] for i in pending], [topics[i] for i in pending], k)
+            fallback = [
+                (i, fused, coverage) for i, (fused, coverage) in zip(pending, ranked)
+                if topics[i] and (len(fused) < k or coverage < MIN_TOPIC_COVERAGE)
+            ]
+            global_ranked = self._hybrid_rank([queries[i] for i, _, _ in fallback], [None] * len(fallback), k)
+
+            fused_by_query = dict(zip(pending, (fused for fused, _ in ranked)))
+            for (i, fused, coverage), (global_fused, global_coverage) in zip(fallback, global_ranked):
+                if global_coverage > coverage:
+                    # Another topic matches more of the query's terms: trust the content over the label.
+                    fused_by_query[i] = global_fused
+                else:
+                    for chunk_id, score in global_fused.items():
+                        if self.chunks[chunk_id]['metadata'].get('topic') != topics[i]:
+                            fused.setdefault(chunk_id, score * CROSS_TOPIC_WEIGHT)
+
+            for i in pending:
+                results[i] = self._format_results(fused_by_query[i], topics[i], k)
+                self._query_cache.set(cache_keys[i], results[i])
+
+        return [[dict(result) for result in query_results] for query_results in results]
+
+    def _format_results(self, fused: Dict[str, float], topic: str, k: int) -> List[Dict]:
+        results = []
+        for chunk_id, score in sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]:
+            chunk = self.chunks[chunk_id]
+            results.append({
+                'content': chunk['content'],
+                'metadata': chunk['metadata'],
+                'score': score,
+                'cross_topic': bool(topic) and chunk['metadata'].get('topic') != topic
+            })
+        return results
+
+    def _hybrid_rank(self, queries: List[str], topics: List[str], k: int):
+        if not queries:
+            return []
+        candidates = max(4 * k, 10)
+        lexical_batch = self.lexical_index.search_many(queries, topics, limit=candidates)
+        vector_batch = self.store.query_many(queries, topics, candidates)
+
+        ranked = []
+        for lexical, vector in zip(lexical_batch, vector_batch):
+            fused: Dict[str, float] = {}
+            for ranking in ([chunk_id for chunk_id, _, _ in lexical], [chunk_id for chunk_id in vector if chunk_id in self.chunks]):
+                for rank, chunk_id in enumerate(ranking):
+                    fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            ranked.append((fused, max((coverage for _, _, coverage in lexical), default=0.0)))
+        return ranked
@@ -1,19 +1,25 @@
-from typing import List, Dict
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Dict
 from rag.knowledge_base import KnowledgeBase
 from utils.memory import MemorySystem
 
+# Shared by all Retriever instances to overlap the KB query with the memory search.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='retriever')
+
 class Retriever:
-    def __init__(self):
+    def __init__(self, memory: MemorySystem = None):
         self.kb = KnowledgeBase()
-        self.memory = MemorySystem()
+        self.memory = memory if memory is not None else MemorySystem()
     
     def retrieve_context(self, problem: Dict, k: int = 3) -> Dict:
         problem_text = problem.get('problem_text', '')
         topic = problem.get('topic', '')
         
-        kb_results = self.kb.search(problem_text, topic, k=k)
+        kb_future = _executor.submit(self.kb.search, problem_text, topic, k=k)
         
         similar_problems = self.memory.search_similar(problem_text, topic, limit=2)
+        kb_results = kb_future.result()
         
         context = {
             'knowledge_base': kb_results,
@@ -21,4 +27,65 @@ class Retriever:
             'sources': [r['metadata'] for r in kb_results]
         }
         
-        return context
\ No newline at end of file
+        return context
+    
+    def retrieve_many(self, problems: List[Dict], k: int = 3) -> List[Dict]:
+        # Batch form of retrieve_context: one embedding call and one vector query
+        # per topic for the knowledge base, one memory pass for the whole batch.
+        texts = [problem.get('problem_text', '') for problem in problems]
+        topics = [problem.get('topic', '') for problem in problems]
+        
+        kb_future = _executor.submit(self.kb.search_many, texts, topics, k)
+        
+        similar_batch = self.memory.search_similar_many(list(zip(texts, topics)), limit=2)
+        kb_batch = kb_future.result()
+        
+        return [
+            {
+                'knowledge_base': kb_results,
+                'similar_problems': similar_problems,
+                'sources': [r['metadata'] for r in kb_results]
+            }
+            for kb_results, similar_problems in zip(kb_batch, similar_batch)
+        ]
+
+class BatchingRetriever:
+    # Drop-in for Retriever.retrieve_context when many pipelines run at once (the
+    # batch runner): calls that arrive within `wait` seconds of each other, up to
+    # max_batch, are answered by a single retrieve_many. The retriever is resolved
+    # on first use, so a failure to build it surfaces per call.
+    def __init__(self, get_retriever: Callable[[], Retriever], max_batch: int, wait: float = 0.025):
+        self.get_retriever = get_retriever
+        self.max_batch = max_batch
+        self.wait = wait
+        self._lock = threading.Lock()
+        self._full = threading.Event()
+        self._pending: List = []
+
+    def retrieve_context(self, problem: Dict, k: int = 3) -> Dict:
+        future = Future()
+        with self._lock:
+            self._pending.append((problem, k, future))
+            leader = len(self._pending) == 1
+            if len(self._pending) >= self.max_batch:
+                self._full.set()
+        if leader:
+            # The first caller of a batch collects the others and runs it.
+            self._full.wait(self.wait)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._full.clear()
+            self._run(batch)
+        return future.result()
+
+    def _run(self, batch: List):
+        try:
+            retriever = self.get_retriever()
+            for k in {k for _, k, _ in batch}:
+                group = [(problem, future) for problem, group_k, future in batch if group_k == k]
+                for (_, future), context in zip(group, retriever.retrieve_many([problem for problem, _ in group], k)):
+                    future.set_result(context)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
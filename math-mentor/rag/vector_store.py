@@ -0,0 +1,299 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from rag.embeddings import Embedder
+
+COLLECTION_NAME = 'math_knowledge'
+
+class ChromaVectorStore:
+    # Default backend: a persistent Chroma collection. Queries are embedded by our
+    # own (cached) embedder rather than through the collection.
+    def __init__(self, persist_dir: str, embedder: Embedder):
+        import chromadb
+        from chromadb.config import Settings
+
+        self.embedder = embedder
+        self.name = 'chroma'
+        self.client = chromadb.PersistentClient(path=persist_dir, settings=Settings(
+            anonymized_telemetry=False,
+            allow_reset=True
+        ))
+        self.collection = self.client.get_or_create_collection(COLLECTION_NAME, embedding_function=embedder)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def reset(self):
+        self.client.delete_collection(COLLECTION_NAME)
+        self.collection = self.client.get_or_create_collection(COLLECTION_NAME, embedding_function=self.embedder)
+
+    def ids_for_source(self, source: str) -> Set[str]:
+        return set(self.collection.get(where={'source': source}, include=[])['ids'])
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        self.collection.add(
+            ids=ids,
+            documents=documents,
+            metadatas=metadatas,
+            embeddings=self.embedder.embed(documents).tolist()
+        )
+
+    def delete(self, ids: List[str]):
+        self.collection.delete(ids=ids)
+
+    def delete_source(self, source: str):
+        self.collection.delete(where={'source': source})
+
+    def get_all(self) -> List[Tuple[str, str, Dict]]:
+        stored = self.collection.get(include=['documents', 'metadatas'])
+        return list(zip(stored['ids'], stored['documents'], stored['metadatas']))
+
+    def flush(self):
+        pass
+
+    def query(self, query: str, topic: Optional[str], n: int) -> List[str]:
+        return self.query_many([query], [topic], n)[0]
+
+    def query_many(self, queries: List[str], topics: List[Optional[str]], n: int) -> List[List[str]]:
+        # One embedding call for the batch, then one collection query per distinct topic filter.
+        results: List[List[str]] = [[] for _ in queries]
+        n = min(n, self.count())
+        if n == 0 or not queries:
+            return results
+        vectors = self.embedder.embed(queries)
+        for topic, positions in _group_by_topic(topics).items():
+            found = self.collection.query(
+                query_embeddings=vectors[positions].tolist(),
+                n_results=n,
+                where={"topic": topic} if topic else None,
+                include=[]
+            )
+            for position, ids in zip(positions, found['ids']):
+                results[position] = ids
+        return results
+
+class FaissVectorStore:
+    # One FAISS index per topic, memory-mapped from disk so start-up does not
+    # load vectors into RAM. Chunks, metadata and the vectors themselves live in
+    # SQLite; a topic's index is rebuilt from there when its chunks change.
+    #   flat - exact inner product search
+    #   ivf  - inverted lists (nlist clusters, nprobe searched), for large topics
+    #   hnsw - graph search (hnsw_m links per node, ef_search candidates)
+    def __init__(self, persist_dir: str, embedder: Embedder, index_type: str = 'flat',
+                 nlist: int = 256, nprobe: int = 16, hnsw_m: int = 32, ef_search: int = 64):
+        import faiss
+        self.faiss = faiss
+
+        if index_type not in ('flat', 'ivf', 'hnsw'):
+            raise ValueError(f"Unknown FAISS index type: {index_type}")
+        self.embedder = embedder
+        self.index_type = index_type
+        self.name = f'faiss:{index_type}'
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+
+        self.index_dir = os.path.join(persist_dir, 'faiss')
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.index_dir, 'chunks.sqlite'), check_same_thread=False, timeout=10)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS chunks (row INTEGER PRIMARY KEY, id TEXT UNIQUE, topic TEXT, '
+            'source TEXT, document TEXT, metadata TEXT, vector BLOB)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS chunks_topic ON chunks (topic)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source)')
+        self._conn.commit()
+
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, object] = {}
+        self._dirty: Set[str] = set()
+
+    def _index_path(self, topic: str) -> str:
+        name = re.sub(r'[^\w\-]', '_', topic) or '_'
+        return os.path.join(self.index_dir, f'{name}.{self.index_type}.index')
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM chunks').fetchone()[0]
+
+    def reset(self):
+        with self._lock:
+            topics = [row[0] for row in self._conn.execute('SELECT DISTINCT topic FROM chunks')]
+            self._conn.execute('DELETE FROM chunks')
+            self._conn.commit()
+            for topic in topics:
+                if os.path.exists(self._index_path(topic)):
+                    os.remove(self._index_path(topic))
+            self._indexes.clear()
+            self._dirty.clear()
+
+    def ids_for_source(self, source: str) -> Set[str]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute('SELECT id FROM chunks WHERE source = ?', (source,))}
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        vectors = self.embedder.embed(documents)
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO chunks (id, topic, source, document, metadata, vector) VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (chunk_id, metadata.get('topic', ''), metadata.get('source', ''), document,
+                     json.dumps(metadata), np.asarray(vector, dtype=np.float32).tobytes())
+                    for chunk_id, document, metadata, vector in zip(ids, documents, metadatas, vectors)
+                ]
+            )
+            self._conn.commit()
+            self._dirty.update(metadata.get('topic', '') for metadata in metadatas)
+
+    def delete(self, ids: List[str]):
+        self._delete('id', ids)
+
+    def delete_source(self, source: str):
+        self._delete('source', [source])
+
+    def _delete(self, column: str, values: List[str]):
+        with self._lock:
+            for i in range(0, len(values), 500):
+                batch = values[i:i + 500]
+                placeholders = ','.join('?' * len(batch))
+                topics = self._conn.execute(
+                    f'SELECT DISTINCT topic FROM chunks WHERE {column} IN ({placeholders})', batch
+                ).fetchall()
+                self._conn.execute(f'DELETE FROM chunks WHERE {column} IN ({placeholders})', batch)
+                self._dirty.update(topic for topic, in topics)
+            self._conn.commit()
+
+    def get_all(self) -> List[Tuple[str, str, Dict]]:
+        with self._lock:
+            rows = self._conn.execute('SELECT id, document, metadata FROM chunks ORDER BY row').fetchall()
+        return [(chunk_id, document, json.loads(metadata)) for chunk_id, document, metadata in rows]
+
+    def flush(self):
+        # Rebuilds and saves every topic index whose chunks changed.
+        with self._lock:
+            for topic in list(self._dirty):
+                self._rebuild(topic)
+            self._dirty.clear()
+
+    def _rebuild(self, topic: str):
+        faiss = self.faiss
+        rows = self._conn.execute('SELECT row, vector FROM chunks WHERE topic = ? ORDER BY row', (topic,)).fetchall()
+        path = self._index_path(topic)
+        self._indexes.pop(topic, None)
+        if not rows:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+
+        labels = np.array([row for row, _ in rows], dtype=np.int64)
+        vectors = np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+        dimension = vectors.shape[1]
+
+        if self.index_type == 'hnsw':
+            base = faiss.IndexHNSWFlat(dimension, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        elif self.index_type == 'ivf' and len(rows) >= 4 * self.nlist:
+            quantizer = faiss.IndexFlatIP(dimension)
+            base = faiss.IndexIVFFlat(quantizer, dimension, self.nlist, faiss.METRIC_INNER_PRODUCT)
+            base.train(vectors)
+        else:
+            # Too few vectors to train IVF clusters; exact search is fast at this size anyway.
+            base = faiss.IndexFlatIP(dimension)
+
+        index = faiss.IndexIDMap2(base)
+        index.add_with_ids(vectors, labels)
+
+        tmp_path = path + '.tmp'
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, path)
+
+    def _load(self, topic: str):
+        index = self._indexes.get(topic)
+        if index is not None:
+            return index
+
+        faiss = self.faiss
+        path = self._index_path(topic)
+        if not os.path.exists(path):
+            # First use of this index type, or the file was removed: build it from SQLite.
+            self._rebuild(topic)
+            if not os.path.exists(path):
+                return None
+        try:
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Not every index type can be mapped; read it into memory instead.
+            index = faiss.read_index(path)
+
+        base = faiss.downcast_index(index.index)
+        if isinstance(base, faiss.IndexIVF):
+            base.nprobe = self.nprobe
+        elif isinstance(base, faiss.IndexHNSW):
+            base.hnsw.efSearch = self.ef_search
+        self._indexes[topic] = index
+        return index
+
+    def _topics(self) -> List[str]:
+        return [row[0] for row in self._conn.execute('SELECT DISTINCT topic FROM chunks')]
+
+    def query(self, query: str, topic: Optional[str], n: int) -> List[str]:
+        return self.query_many([query], [topic], n)[0]
+
+    def query_many(self, queries: List[str], topics: List[Optional[str]], n: int) -> List[List[str]]:
+        # One embedding call for the batch; each topic index is searched once
+        # with all of the queries that target it.
+        if not queries:
+            return []
+        vectors = self.embedder.embed(queries)
+        hits: List[List[Tuple[float, int]]] = [[] for _ in queries]
+        with self._lock:
+            for dirty in list(self._dirty):
+                self._rebuild(dirty)
+            self._dirty.clear()
+
+            all_topics = None
+            for topic, positions in _group_by_topic(topics).items():
+                if topic:
+                    parts = [topic]
+                else:
+                    all_topics = all_topics if all_topics is not None else self._topics()
+                    parts = all_topics
+                for part in parts:
+                    index = self._load(part)
+                    if index is None:
+                        continue
+                    scores, labels = index.search(vectors[positions], min(n, index.ntotal))
+                    for position, row_scores, row_labels in zip(positions, scores, labels):
+                        hits[position].extend((score, label) for score, label in zip(row_scores, row_labels) if label != -1)
+
+            ranked = []
+            for query_hits in hits:
+                query_hits.sort(key=lambda hit: hit[0], reverse=True)
+                ranked.append([int(label) for _, label in query_hits[:n]])
+            wanted = sorted({label for labels in ranked for label in labels})
+            rows = {}
+            for i in range(0, len(wanted), 500):
+                batch = wanted[i:i + 500]
+                rows.update(self._conn.execute(
+                    f"SELECT row, id FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+        return [[rows[label] for label in labels if label in rows] for labels in ranked]
+
+def _group_by_topic(topics: List[Optional[str]]) -> Dict[Optional[str], List[int]]:
+    groups: Dict[Optional[str], List[int]] = {}
+    for position, topic in enumerate(topics):
+        groups.setdefault(topic or None, []).append(position)
+    return groups
+
+def create_vector_store(persist_dir: str, embedder: Embedder, backend: Optional[str] = None):
+    # VECTOR_STORE: 'chroma' (default) or 'faiss'; FAISS_INDEX picks flat, ivf or hnsw.
+    backend = (backend or os.getenv('VECTOR_STORE', 'chroma')).lower()
+    if backend == 'faiss':
+        return FaissVectorStore(persist_dir, embedder, index_type=os.getenv('FAISS_INDEX', 'flat').lower())
+    return ChromaVectorStore(persist_dir, embedder)
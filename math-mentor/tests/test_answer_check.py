@@ -0,0 +1,56 @@
+import pytest
+
+from utils.answer_check import AnswerChecker
+
+@pytest.fixture(scope='module')
+def checker():
+    return AnswerChecker()
+
+def check(checker, problem, variables, answer):
+    return checker.check({'problem_text': problem, 'variables': variables}, {'solution': f"Final Answer: {answer}"})
+
+@pytest.mark.parametrize('problem, variables, answer', [
+    ('x^2 = 2', ['x'], 'x = ±1.414'),
+    ('evaluate 1/3', [], '0.333'),
+    ('integrate x^2 from 0 to 1', ['x'], '0.3333'),
+    ('evaluate 2/3', [], '0.6667'),
+    ('x + y = 5, x - y = 1', ['x', 'y'], 'x = 3.0, y = 2.0'),
+])
+def test_rounded_decimal_answers_are_correct(checker, problem, variables, answer):
+    assert check(checker, problem, variables, answer)['is_correct'] is True
+
+@pytest.mark.parametrize('problem, variables, answer', [
+    # Truncated rather than rounded: within the written precision, but not half of it.
+    ('evaluate 2/3', [], '0.6666'),
+    ('x^2 = 2', ['x'], 'x = 1.5'),
+])
+def test_imprecise_decimal_answers_are_inconclusive(checker, problem, variables, answer):
+    assert check(checker, problem, variables, answer) is None
+
+def test_wrong_decimal_answer_is_rejected(checker):
+    assert check(checker, 'x^2 = 2', ['x'], 'x = 3.7')['is_correct'] is False
+    assert check(checker, 'evaluate 1/3', [], '0.5')['is_correct'] is False
+
+@pytest.mark.parametrize('answer', ['**x = 2, 3**', 'x = 2 or x = 3', 'x = 2, x = 3', 'x = 2 and 3'])
+def test_value_lists(checker, answer):
+    assert check(checker, 'x^2 - 5x + 6 = 0', ['x'], answer)['is_correct'] is True
+
+def test_missing_root(checker):
+    result = check(checker, 'x^2 - 5x + 6 = 0', ['x'], 'x = 2')
+    assert result['is_correct'] is False
+    assert result['issues'] == ['Missing solution x = 3']
+
+def test_exact_answers(checker):
+    assert check(checker, '3x + 7 = 22', ['x'], 'x = 5. Check: 3(5) + 7 = 22')['is_correct'] is True
+    assert check(checker, '3x + 7 = 22', ['x'], 'x = 6')['is_correct'] is False
+
+def test_unsubstituted_variable_is_inconclusive(checker):
+    assert check(checker, 'x^2+y^2=25', ['x'], 'x = 3, y = 4') is None
+
+@pytest.mark.parametrize('problem, answer', [('log(100)', '2'), ('log(100)', '4.605'), ('evaluate log 1000', '3')])
+def test_log_without_base_is_inconclusive(checker, problem, answer):
+    assert check(checker, problem, [], answer) is None
+
+@pytest.mark.parametrize('problem, answer', [('ln(100)', '4.605'), ('log(100, 10)', '2')])
+def test_log_with_explicit_base(checker, problem, answer):
+    assert check(checker, problem, [], answer)['is_correct'] is True
@@ -0,0 +1,88 @@
+import pytest
+import sympy
+
+from utils.math_engine import MathEngine
+
+x, y = sympy.symbols('x y')
+
+@pytest.fixture(scope='module')
+def engine():
+    return MathEngine()
+
+def solve(engine, text, variables=()):
+    return engine.solve({'problem_text': text, 'variables': list(variables)})
+
+def test_equation(engine):
+    result = solve(engine, 'x^2 - 5x + 6 = 0', 'x')
+    assert result['task'] == 'equation'
+    assert result['value'] == [2, 3]
+    assert result['answer'] == 'x = 2, x = 3'
+    assert result['solution'].endswith('Final Answer: x = 2, x = 3')
+
+def test_equation_without_real_roots(engine):
+    result = solve(engine, 'x^2 + 1 = 0', 'x')
+    assert result['value'] == []
+    assert result['answer'].startswith('No real solution')
+
+def test_system(engine):
+    result = solve(engine, 'x + y = 10, x - y = 2', 'xy')
+    assert result['task'] == 'system'
+    assert result['value'] == [{x: 6, y: 4}]
+
+@pytest.mark.parametrize('text, expected', [
+    ('derivative of x^3 + 2x', 3 * x ** 2 + 2),
+    ('second derivative of sin(x)', -sympy.sin(x)),
+])
+def test_derivative(engine, text, expected):
+    result = solve(engine, text, 'x')
+    assert result['task'] == 'derivative'
+    assert sympy.simplify(result['value'] - expected) == 0
+
+def test_indefinite_integral(engine):
+    result = solve(engine, 'integrate x^2', 'x')
+    assert (result['task'], result['indefinite']) == ('integral', True)
+    assert result['value'] == x ** 3 / 3
+    assert result['answer'] == 'x^3/3 + C'
+
+def test_definite_integral(engine):
+    result = solve(engine, 'integrate x^2 from 0 to 3', 'x')
+    assert (result['task'], result['indefinite'], result['value']) == ('integral', False, 9)
+
+@pytest.mark.parametrize('text', ['limit of sin(x)/x as x approaches 0', 'lim x->0 sin(x)/x'])
+def test_limit(engine, text):
+    result = solve(engine, text, 'x')
+    assert (result['task'], result['value']) == ('limit', 1)
+
+@pytest.mark.parametrize('text, task, expected', [
+    ('determinant of [[1,2],[3,4]]', 'determinant', -2),
+    ('inverse of [[1,2],[3,4]]', 'inverse', sympy.Matrix([[-2, 1], [sympy.Rational(3, 2), -sympy.Rational(1, 2)]])),
+    ('rank of [[1,2],[2,4]]', 'rank', 1),
+])
+def test_matrix(engine, text, task, expected):
+    result = solve(engine, text)
+    assert (result['task'], result['value']) == (task, expected)
+
+@pytest.mark.parametrize('text, expected', [
+    ('evaluate 2^10 + 3!', 1030),
+    ('5C2', 10),
+    ('5P2', 20),
+    ('ln(1)', 0),
+    ('log(100, 10)', 2),
+])
+def test_evaluation_and_combinatorics(engine, text, expected):
+    result = solve(engine, text)
+    assert (result['task'], result['value']) == ('evaluation', expected)
+
+@pytest.mark.parametrize('text', [
+    'A bag has 3 red balls and 2 blue balls. Find the probability of drawing a red ball.',
+    'If x > 0, solve x^2 = 4',
+    'solve x^2 = 4 where x > 0',
+    'x^2 = 4, give the larger root',
+    # Base 10 or e depends on the reader.
+    'log(100)',
+    # Refused rather than computed.
+    '2^(10^10)',
+    'factorial(100000)',
+])
+def test_falls_back_to_the_llm(engine, text):
+    assert solve(engine, text, 'x') is None
@@ -0,0 +1,24 @@
+import pytest
+
+from utils.rule_parser import CONFIDENCE_THRESHOLD, RuleBasedParser
+
+@pytest.mark.parametrize('text', [
+    "Find P(A|B) if P(A)=0.3",
+    "Given P(A)=0.5 and P(B)=0.4 find P(A and B)",
+    "E(X) = 3, Var(X) = 2, find E(X^2)",
+])
+def test_probability_notation_goes_to_the_llm(text):
+    result = RuleBasedParser().parse(text)
+    assert result['topic'] == 'probability'
+    assert result['variables'] == []
+    assert result['parser_confidence'] < CONFIDENCE_THRESHOLD
+
+@pytest.mark.parametrize('text, topic, variables', [
+    ("3x + 7 = 22", 'algebra', ['x']),
+    ("x^3 + y^3 = z^3", 'algebra', ['x', 'y', 'z']),
+    ("If x > 0, solve x^2 = 4", 'algebra', ['x']),
+])
+def test_well_formed_problems_are_parsed_locally(text, topic, variables):
+    result = RuleBasedParser().parse(text)
+    assert (result['topic'], result['variables']) == (topic, variables)
+    assert result['parser_confidence'] >= CONFIDENCE_THRESHOLD
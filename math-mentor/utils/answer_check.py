@@ -0,0 +1,309 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import sympy
+
+from utils.math_engine import (
+    NotSolvable,
+    fmt,
+    get_math_engine,
+    normalize_problem,
+    parse_equations,
+    parse_expression,
+    parse_matrix,
+)
+
+SAMPLE_POINTS = 64
+MIN_VALID_POINTS = 16
+RELATIVE_TOLERANCE = 1e-6
+ABSOLUTE_TOLERANCE = 1e-8
+
+FINAL_ANSWER = re.compile(r'final\s+answer', re.I)
+NO_SOLUTION = re.compile(r'\bno\s+(?:real\s+)?solutions?\b', re.I)
+LATEX = (
+    (re.compile(r'\\boxed\{([^{}]*)\}'), r'\1'),
+    (re.compile(r'\\[dt]?frac\{([^{}]+)\}\{([^{}]+)\}'), r'((\1)/(\2))'),
+    (re.compile(r'\\sqrt\{([^{}]+)\}'), r'sqrt(\1)'),
+    (re.compile(r'\\(?:cdot|times)'), '*'),
+    (re.compile(r'\\pi\b'), 'pi'),
+    (re.compile(r'\\pm\b'), '±'),
+    (re.compile(r'\\(?:left|right)|\\[,;!]|\\[()\[\]]|[$`]'), ' '),
+    # Markdown bold, but not a ** power ("x**2").
+    (re.compile(r'\*\*(?!\s*\d)'), ' '),
+)
+# log(100) or "log 100" with no base: 2 and 4.605 are both right, by convention.
+BARE_LOG = re.compile(r'\blog\s*(?:\((?:[^(),]|\([^()]*\))*\)|(?!\()\w)', re.I)
+INTEGRATION_CONSTANT = re.compile(r'\s*\+\s*C\b')
+DECIMAL = re.compile(r'(?<![\d.])\d*\.(\d+)')
+VALUE_SEPARATOR = re.compile(r'\s*(?:,|\bor\b|\band\b)\s*')
+
+def _clean(text: str) -> str:
+    # Repeated so nested LaTeX (\frac{-5 + \sqrt{21}}{2}) unwraps from the inside.
+    for _ in range(4):
+        previous = text
+        for pattern, replacement in LATEX:
+            text = pattern.sub(replacement, text)
+        if text == previous:
+            break
+    return text
+
+def _answer_section(solution: Dict) -> str:
+    # The engine's own answer when there is one, else whatever follows the last
+    # "Final Answer" in the solver's text (or its last few lines).
+    if solution.get('answer'):
+        return solution['answer']
+    text = solution.get('solution', '') or ''
+    markers = list(FINAL_ANSWER.finditer(text))
+    if markers:
+        # Only the paragraph holding the answer; a check that follows it
+        # ("3(5) + 7 = 22") would otherwise be read as the answer.
+        section = re.split(r'\n\s*\n', text[markers[-1].end():].lstrip(' :*\n'), maxsplit=1)[0][:500]
+    else:
+        section = '\n'.join([line for line in text.splitlines() if line.strip()][-3:])
+    return _clean(section).strip(' :*\n')
+
+def _parse_candidate(text: str, variables: Tuple[str, ...]):
+    text = INTEGRATION_CONSTANT.sub('', text).strip().rstrip('.').strip()
+    if not text:
+        return None
+    try:
+        if '[' in text:
+            return parse_matrix(normalize_problem(text), variables)
+        return parse_expression(normalize_problem(text), variables)
+    except NotSolvable:
+        return None
+
+def _precision(text: str) -> Optional[float]:
+    # A decimal answer is only as exact as it was written: "1.414" means sqrt(2)
+    # to within one unit in the last place, not the fraction 707/500.
+    places = [len(match.group(1)) for match in DECIMAL.finditer(text)]
+    return 10.0 ** -max(places) if places else None
+
+def _claimed_expression(section: str, variables: Tuple[str, ...]):
+    # "f'(x) = 3x^2 + 2", "The derivative is 3x^2 + 2.", "det(A) = -2", "14".
+    # Returns (value, precision), precision as in _precision.
+    for line in reversed([line.strip() for line in section.splitlines() if line.strip()]):
+        candidates = [line.rsplit('=', 1)[-1]]
+        if re.search(r'\bis\b', line):
+            candidates.append(re.split(r'\bis\b', line)[-1])
+        candidates.append(line)
+        for candidate in candidates:
+            value = _parse_candidate(candidate, variables)
+            if value is not None:
+                return value, _precision(candidate)
+    return None, None
+
+def _claimed_values(section: str, symbols: List[sympy.Symbol], variables: Tuple[str, ...]) -> Tuple[Dict[sympy.Symbol, List], bool]:
+    # Every "x = value" in the answer as (value, precision) pairs; "x = ±3" and
+    # "x = 2, 3" count as two values. The flag is False when the value was only
+    # inferred from prose ("... is 5").
+    claimed = {}
+    for symbol in symbols:
+        values = []
+        # The value is matched in a lookahead so "x = 2 or x = 3" finds both.
+        pattern = re.compile(rf'(?<![A-Za-z]){re.escape(str(symbol))}\s*=\s*(?=(?P<value>[^;=\n]+))')
+        for match in pattern.finditer(section):
+            sentences = re.split(r'\.(?:\s|$)', match.group('value'), maxsplit=1)
+            pieces = VALUE_SEPARATOR.split(sentences[0].strip())
+            if len(sentences) == 1 and section[match.end('value'):match.end('value') + 1] == '=':
+                # "x = 2, y = 3": the last piece names the next variable.
+                pieces = pieces[:-1]
+            for text in pieces:
+                # Drop a trailing remark such as "(rejected)" or an "≈ 1.414" decimal.
+                text = re.sub(r'\s*(?:\([A-Za-z][^()]*\)|≈.*)$', '', text.strip())
+                signs = ('', '-') if text[:1] == '±' or text[:2] == '+-' else ('',)
+                text = text.lstrip('±').replace('+-', '', 1) if len(signs) == 2 else text
+                for sign in signs:
+                    value = _parse_candidate(f"{sign}({text})" if sign else text, variables)
+                    if value is not None and isinstance(value, sympy.Expr) and value not in [v for v, _ in values]:
+                        values.append((value, _precision(text)))
+        claimed[symbol] = values
+    if len(symbols) == 1 and not claimed[symbols[0]]:
+        value, precision = _claimed_expression(section, variables)
+        if isinstance(value, sympy.Expr) and not value.free_symbols:
+            return {symbols[0]: [(value, precision)]}, False
+    return claimed, True
+
+def _agree(pairs: Sequence[Tuple[sympy.Expr, sympy.Expr]], precision: Optional[float] = None) -> Tuple[Optional[bool], int]:
+    # Evaluates every (claimed, expected) pair at the same random points in one
+    # vectorised call. Returns (all equal, points used), or (None, 0) when too
+    # few points are defined to tell. With a precision (a rounded answer), values
+    # must agree to within half of it; a truncated one, off by up to the full
+    # precision, is inconclusive.
+    symbols = sorted(set().union(*[a.free_symbols | b.free_symbols for a, b in pairs]), key=str)
+    # Fixed seed: the same solution always gets the same verdict.
+    rng = np.random.default_rng(0)
+    points = [rng.uniform(0.1, 3.0, SAMPLE_POINTS) * rng.choice([-1.0, 1.0], SAMPLE_POINTS) + 0j for _ in symbols]
+    expressions = [expr for pair in pairs for expr in pair]
+    try:
+        with np.errstate(all='ignore'):
+            values = sympy.lambdify(symbols, expressions, 'numpy')(*points)
+    except Exception:
+        # Functions numpy cannot evaluate (e.g. factorial of an array).
+        return None, 0
+    values = [np.broadcast_to(np.asarray(value, dtype=complex), (SAMPLE_POINTS,)) for value in values]
+    claimed, expected = np.array(values[0::2]), np.array(values[1::2])
+    defined = np.all(np.isfinite(claimed) & np.isfinite(expected), axis=0)
+    if defined.sum() < (MIN_VALID_POINTS if symbols else 1):
+        return None, 0
+    if precision is None:
+        close = np.isclose(claimed[:, defined], expected[:, defined], rtol=RELATIVE_TOLERANCE, atol=ABSOLUTE_TOLERANCE)
+    else:
+        error = np.abs(claimed[:, defined] - expected[:, defined])
+        close = error <= precision / 2 * (1 + RELATIVE_TOLERANCE)
+        if not close.all() and (error <= precision * (1 + RELATIVE_TOLERANCE)).all():
+            return None, 0
+    return bool(close.all()), int(defined.sum()) if symbols else 1
+
+def _describe(solution: Dict) -> str:
+    return ', '.join(f"{fmt(symbol)} = {fmt(value)}" for symbol, value in solution.items())
+
+def _verdict(is_correct: bool, feedback: str, issues: List[str], points: int) -> Dict:
+    return {
+        'is_correct': is_correct,
+        'confidence': 1.0 if is_correct else 0.0,
+        'issues': issues,
+        'needs_review': not is_correct,
+        'feedback': feedback,
+        'cache': None,
+        'method': 'numeric',
+        'points_checked': points
+    }
+
+class AnswerChecker:
+    # Deterministic verification of the solver's final answer. Equation answers
+    # are substituted back into the parsed equations; other answers are compared
+    # with the math engine's exact result at random sample points. check()
+    # returns None when it cannot decide, and the caller asks the LLM instead.
+    def __init__(self):
+        self.engine = get_math_engine()
+
+    def check(self, parsed_problem: Dict, solution: Dict) -> Optional[Dict]:
+        text = parsed_problem.get('problem_text') or ''
+        variables = tuple(str(v) for v in parsed_problem.get('variables') or [] if isinstance(v, str))
+        section = _answer_section(solution)
+        if not text or not section or BARE_LOG.search(text):
+            return None
+        reference = self.engine.solve(parsed_problem)
+        try:
+            if reference is None or reference['task'] in ('equation', 'system'):
+                return self._check_equations(text, variables, section, reference)
+            return self._check_value(reference, section, variables)
+        except (NotSolvable, ValueError, TypeError, ZeroDivisionError, AttributeError):
+            return None
+
+    def _check_equations(self, text: str, variables: Tuple[str, ...], section: str, reference: Optional[Dict]) -> Optional[Dict]:
+        try:
+            parsed = parse_equations(normalize_problem(text), variables)
+        except NotSolvable:
+            return None
+        if parsed is None:
+            return None
+        equations, symbols = parsed
+        expected = reference['value'] if reference is not None else None
+
+        if expected == [] and NO_SOLUTION.search(section):
+            return _verdict(True, "No solution exists, as the answer states.", [], 0)
+        claimed, explicit = _claimed_values(section, symbols, variables)
+        counts = {len(values) for values in claimed.values()}
+        if len(counts) != 1 or 0 in counts:
+            return None
+        candidates = [dict(zip(symbols, values)) for values in zip(*[claimed[symbol] for symbol in symbols])]
+        if expected is not None and reference['task'] == 'equation':
+            expected = [{reference['symbol']: root} for root in expected]
+
+        points = 0
+        failures = []
+        for candidate in candidates:
+            values = {symbol: value for symbol, (value, _) in candidate.items()}
+            precision = max((p for _, p in candidate.values() if p is not None), default=None)
+            if precision is not None:
+                # A rounded value does not satisfy the equation exactly; compare it
+                # with the exact solutions instead, to the precision it was written with.
+                if expected is None:
+                    return None
+                agree = self._matches_any(values, expected, precision)
+                if agree is None:
+                    return None
+            else:
+                substituted = [(lhs.subs(values), rhs.subs(values)) for lhs, rhs in equations]
+                if any(side.free_symbols for pair in substituted for side in pair):
+                    # The answer leaves a variable of the equation undetermined.
+                    return None
+                agree, used = _agree(substituted)
+                if agree is None:
+                    return None
+                points += used
+            if not agree:
+                failures.append(values)
+        if failures and (len(failures) < len(candidates) or not explicit):
+            # Probably an extraneous root the solver mentioned and rejected, or a
+            # number picked out of prose that was not the answer.
+            return None
+        if failures:
+            issues = [f"{_describe(c)} does not satisfy " + '; '.join(f"{fmt(l)} = {fmt(r)}" for l, r in equations)
+                      for c in failures]
+            return _verdict(False, "Substituting the final answer back into the equation fails.", issues, points)
+
+        if expected is None:
+            # Every claimed solution works, but without an exact solve we cannot
+            # tell whether any are missing.
+            return None
+        missing = []
+        for solution in expected:
+            found = [self._matches_any({s: v for s, (v, _) in c.items()}, [solution],
+                                       max((p for _, p in c.values() if p is not None), default=None))
+                     for c in candidates]
+            if not any(found):
+                if None in found:
+                    return None
+                missing.append(solution)
+        if missing:
+            issues = [f"Missing solution {_describe(solution)}" for solution in missing]
+            return _verdict(False, "The final answer satisfies the equation but misses solutions.", issues, points)
+        described = '; '.join(_describe({s: v for s, (v, _) in c.items()}) for c in candidates)
+        return _verdict(True, f"Substituting {described} back into the equation checks out.", [], points)
+
+    def _matches_any(self, values: Dict, solutions: List[Dict], precision: Optional[float]) -> Optional[bool]:
+        # Whether the claimed values equal one of the solutions; None if that
+        # cannot be told at the given precision.
+        verdicts = []
+        for solution in solutions:
+            pairs = [(values[symbol], solution[symbol]) for symbol in values if symbol in solution]
+            verdicts.append(_agree(pairs, precision)[0] if pairs else False)
+        if any(verdicts):
+            return True
+        return None if None in verdicts else False
+
+    def _check_value(self, reference: Dict, section: str, variables: Tuple[str, ...]) -> Optional[Dict]:
+        expected = reference['value']
+        if expected is None:
+            return None
+        claimed, precision = _claimed_expression(section, variables)
+        if claimed is None:
+            return None
+        if precision is not None and getattr(claimed, 'free_symbols', None):
+            # A formula with rounded coefficients cannot be compared exactly.
+            return None
+
+        if isinstance(expected, sympy.MatrixBase):
+            if not isinstance(claimed, sympy.MatrixBase) or claimed.shape != expected.shape:
+                return None
+            pairs = list(zip(claimed, expected))
+        elif isinstance(claimed, sympy.MatrixBase):
+            return None
+        elif reference.get('indefinite'):
+            # Antiderivatives may differ by a constant: compare their derivatives.
+            symbol = reference['symbol']
+            pairs = [(sympy.diff(claimed, symbol), sympy.diff(expected, symbol))]
+        else:
+            pairs = [(claimed, expected)]
+
+        agree, points = _agree(pairs, precision)
+        if agree is None:
+            return None
+        if agree:
+            return _verdict(True, f"The final answer matches the exact result at {points} sample points.", [], points)
+        return _verdict(False, "The final answer does not match the exact result.",
+                        [f"Expected {fmt(expected)}, got {fmt(claimed)}"], points)
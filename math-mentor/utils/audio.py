@@ -81,52 +81,272 @@
 
 
 
-import whisper
-import os
+import io
+import math
+import shutil
+import subprocess
+import threading
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+# Matches HITLSystem's audio threshold; words below LOW_WORD_PROBABILITY are highlighted.
+REVIEW_THRESHOLD = 0.6
+LOW_WORD_PROBABILITY = 0.5
+COMPRESSION_RATIO_LIMIT = 2.4
+
+def decode_audio(data: bytes, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    # Decodes an upload to mono float32 at Whisper's sample rate without touching
+    # disk: soundfile for WAV/FLAC/OGG, ffmpeg over pipes for MP3/M4A.
+    import soundfile as sf
+    try:
+        audio, source_rate = sf.read(io.BytesIO(data), dtype='float32', always_2d=True)
+    except Exception:
+        return _decode_with_ffmpeg(data, sample_rate)
+
+    audio = audio.mean(axis=1)
+    if source_rate != sample_rate:
+        import torch
+        import torchaudio
+        audio = torchaudio.functional.resample(torch.from_numpy(audio), source_rate, sample_rate).numpy()
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+def _decode_with_ffmpeg(data: bytes, sample_rate: int) -> np.ndarray:
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError("ffmpeg is required to decode this audio format")
+    process = subprocess.run(
+        ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', 'pipe:0',
+         '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), 'pipe:1'],
+        input=data, capture_output=True, check=False
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {process.stderr.decode(errors='ignore').strip()}")
+    return np.frombuffer(process.stdout, np.int16).astype(np.float32) / 32768.0
+
+def detect_speech(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, frame_ms: int = 30,
+                  min_silence_ms: int = 400, min_speech_ms: int = 90, padding_ms: int = 200,
+                  max_chunk_seconds: float = 30.0) -> List[Tuple[int, int]]:
+    # Energy-based VAD. Returns padded (start, end) sample ranges of speech;
+    # silences of min_silence_ms or more separate ranges, and no range is
+    # longer than max_chunk_seconds (one Whisper window).
+    frame = int(sample_rate * frame_ms / 1000)
+    count = len(audio) // frame
+    if count == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    energy = 10 * np.log10(np.mean(audio[:count * frame].reshape(count, frame) ** 2, axis=1) + 1e-10)
+    # Relative to this clip's noise floor, but never so low that pure silence counts as speech.
+    threshold = max(-50.0, min(np.percentile(energy, 10) + 12, energy.max() - 25))
+    speech = energy > threshold
+
+    regions = []
+    start = None
+    for index, is_speech in enumerate(np.append(speech, False)):
+        if is_speech and start is None:
+            start = index
+        elif not is_speech and start is not None:
+            regions.append([start, index])
+            start = None
+
+    min_silence = max(1, min_silence_ms // frame_ms)
+    merged = []
+    for region in regions:
+        if merged and region[0] - merged[-1][1] < min_silence:
+            merged[-1][1] = region[1]
+        else:
+            merged.append(region)
+
+    padding = padding_ms // frame_ms
+    max_frames = int(max_chunk_seconds * 1000 / frame_ms)
+    ranges = []
+    for first, last in merged:
+        if last - first < max(1, min_speech_ms // frame_ms):
+            continue
+        first = max(first - padding, ranges[-1][1] if ranges else 0)
+        last = min(count, last + padding)
+        # Cut over-long speech at the last quietest frame in the back half of the window.
+        while last - first > max_frames:
+            window = energy[first + max_frames // 2:first + max_frames]
+            cut = first + max_frames - 1 - int(np.argmin(window[::-1]))
+            ranges.append((first, cut))
+            first = cut
+        ranges.append((first, last))
+
+    samples = [(first * frame, last * frame) for first, last in ranges]
+    if ranges and ranges[-1][1] == count:
+        samples[-1] = (samples[-1][0], len(audio))
+    return samples
+
+def pack_speech(ranges: List[Tuple[int, int]], max_samples: int) -> List[List[Tuple[int, int]]]:
+    # Groups consecutive speech ranges so each group fills at most one Whisper
+    # window; Whisper pads every call to 30 s, so fewer, fuller calls are cheaper.
+    groups = []
+    length = 0
+    for start, end in ranges:
+        if groups and length + end - start <= max_samples:
+            groups[-1].append((start, end))
+            length += end - start
+        else:
+            groups.append([(start, end)])
+            length = end - start
+    return groups
+
+def _clip_time(seconds: float, group: List[Tuple[int, int]]) -> float:
+    # Maps a time inside a packed speech buffer back to the original clip.
+    offset = int(seconds * SAMPLE_RATE)
+    for start, end in group:
+        if offset <= end - start:
+            return (start + offset) / SAMPLE_RATE
+        offset -= end - start
+    return group[-1][1] / SAMPLE_RATE
+
+def segment_confidence(segment: Dict) -> float:
+    # exp(avg_logprob) is the geometric-mean token probability; word
+    # probabilities catch single misheard terms it averages away. Likely
+    # silence and repetition loops (high compression ratio) are discounted.
+    confidence = math.exp(segment.get('avg_logprob', -math.inf))
+    words = segment.get('words') or []
+    if words:
+        confidence = (confidence + float(np.mean([word['probability'] for word in words]))) / 2
+    confidence *= 1 - segment.get('no_speech_prob', 0.0)
+    if segment.get('compression_ratio', 0.0) > COMPRESSION_RATIO_LIMIT:
+        confidence *= 0.5
+    return confidence
+
+def low_confidence_spans(words: List[Dict], threshold: float = LOW_WORD_PROBABILITY) -> List[Dict]:
+    spans = []
+    for word in words:
+        if word['probability'] >= threshold:
+            continue
+        if spans and spans[-1]['last'] == word['index'] - 1:
+            span = spans[-1]
+            span['text'] += word['word']
+            span['end'] = word['end']
+            span['confidence'] = min(span['confidence'], word['probability'])
+            span['last'] = word['index']
+        else:
+            spans.append({'text': word['word'], 'start': word['start'], 'end': word['end'],
+                          'confidence': word['probability'], 'last': word['index']})
+    return [{key: value for key, value in span.items() if key != 'last'} for span in spans]
+
+def _weighted_mean(scores: List[Tuple[float, int]]) -> float:
+    total = sum(weight for _, weight in scores)
+    return sum(score * weight for score, weight in scores) / total if total else 0.0
 
 class AudioProcessor:
-    def __init__(self):
-        try:
-            self.model = whisper.load_model("tiny")  # Smaller, faster
-        except:
-            self.model = None
-    
+    def __init__(self, model_name: str = "tiny", max_chunk_seconds: float = 30.0):
+        self.model_name = model_name
+        self.max_chunk_seconds = max_chunk_seconds
+        # Part of the result-cache key: bump when transcripts for the same bytes change.
+        self.cache_version = f"whisper-{model_name}-en-vad-words"
+        self._model = None
+        self._model_loaded = False
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        # Whisper (and torch) are imported and the model loaded on first use.
+        if not self._model_loaded:
+            with self._model_lock:
+                if not self._model_loaded:
+                    try:
+                        import whisper
+                        self._model = whisper.load_model(self.model_name)  # Smaller, faster
+                    except:
+                        self._model = None
+                    self._model_loaded = True
+        return self._model
+
+    def load(self):
+        return self.model
+
     def transcribe(self, audio_file):
+        result = None
+        for event in self.transcribe_stream(audio_file):
+            if 'result' in event:
+                result = event['result']
+        return result
+
+    def transcribe_stream(self, audio_file) -> Iterator[Dict]:
+        # Yields {'delta', 'start', 'end', 'confidence'} as each speech chunk is
+        # transcribed, then {'result'}. Everything is held in this call's own buffers.
         if self.model is None:
-            return {
-                'text': "",
-                'confidence': 0.0,
-                'needs_review': True
-            }
-        
-        # Save to temp file
-        temp_path = "temp_audio.wav"
-        
+            yield {'result': self._empty_result()}
+            return
+
         try:
-            with open(temp_path, "wb") as f:
-                f.write(audio_file.getvalue())
-            
-            # Transcribe
-            result = self.model.transcribe(temp_path, language="en", fp16=False)
-            
-            text = result.get('text', '').strip()
-            
-            return {
-                'text': text,
-                'confidence': 0.8,
-                'needs_review': len(text) < 5
-            }
-            
+            data = audio_file if isinstance(audio_file, bytes) else audio_file.getvalue()
+            audio = decode_audio(data)
+        except Exception as e:
+            print(f"Audio decoding error: {e}")
+            yield {'result': self._empty_result()}
+            return
+
+        chunks = []
+        words = []
+        scores = []
+        try:
+            ranges = detect_speech(audio, max_chunk_seconds=self.max_chunk_seconds)
+            for group in pack_speech(ranges, int(self.max_chunk_seconds * SAMPLE_RATE)):
+                # Only speech is decoded: the silences between ranges are dropped.
+                buffer = np.concatenate([audio[start:end] for start, end in group])
+                # The previous chunk's text keeps terms and spelling consistent across cuts.
+                prompt = chunks[-1]['text'] if chunks else None
+                output = self.model.transcribe(
+                    buffer, language="en", fp16=False,
+                    initial_prompt=prompt, condition_on_previous_text=False,
+                    word_timestamps=True
+                )
+                text = output.get('text', '').strip()
+                if not text:
+                    continue
+
+                chunk_scores = []
+                for segment in output.get('segments', []):
+                    # Weight each segment by its word count so one short filler
+                    # segment cannot dominate the clip's confidence.
+                    chunk_scores.append((segment_confidence(segment), max(1, len(segment.get('words') or []))))
+                    for word in segment.get('words') or []:
+                        words.append({
+                            'index': len(words),
+                            'word': word['word'],
+                            'start': _clip_time(word['start'], group),
+                            'end': _clip_time(word['end'], group),
+                            'probability': float(word['probability'])
+                        })
+                scores.extend(chunk_scores)
+
+                chunk = {
+                    'text': text,
+                    'start': group[0][0] / SAMPLE_RATE,
+                    'end': group[-1][1] / SAMPLE_RATE,
+                    'speech': len(buffer) / SAMPLE_RATE,
+                    'confidence': _weighted_mean(chunk_scores)
+                }
+                chunks.append(chunk)
+                yield {'delta': text, **chunk}
         except Exception as e:
             print(f"Transcription error: {e}")
-            return {
-                'text': "",
-                'confidence': 0.0,
-                'needs_review': True
-            }
-        finally:
-            if os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except:
-                    pass
\ No newline at end of file
+            yield {'result': self._empty_result()}
+            return
+
+        text = ' '.join(chunk['text'] for chunk in chunks)
+        confidence = _weighted_mean(scores)
+        yield {'result': {
+            'text': text,
+            'confidence': confidence,
+            'needs_review': confidence < REVIEW_THRESHOLD or len(text) < 5,
+            'words': [{key: value for key, value in word.items() if key != 'index'} for word in words],
+            'low_confidence_spans': low_confidence_spans(words),
+            'chunks': chunks,
+            'duration': len(audio) / SAMPLE_RATE,
+            'speech_duration': sum(chunk['speech'] for chunk in chunks)
+        }}
+
+    def _empty_result(self) -> Dict:
+        return {
+            'text': "",
+            'confidence': 0.0,
+            'needs_review': True
+        }
@@ -0,0 +1,270 @@
+import ast
+import math
+import operator
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+MAX_EXPRESSION_LENGTH = 500
+MAX_NODES = 300
+MAX_INT_BITS = 4096
+MAX_FACTORIAL = 1000
+MAX_COMBINATORIC_N = 10000
+MAX_TABLE_SIZE = 10000
+
+TABLE_PATTERN = re.compile(r'^(?P<expr>.+?)\s+for\s+(?P<var>[A-Za-z_]\w*)\s+in\s+(?P<domain>.+)$')
+
+class ExpressionError(ValueError):
+    pass
+
+def _check_int(value):
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise ExpressionError("Result too large")
+    return value
+
+def _is_array(*args) -> bool:
+    return any(isinstance(arg, np.ndarray) for arg in args)
+
+def _as_int(value, name: str) -> int:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ExpressionError(f"{name} needs integer arguments")
+    return value
+
+def _pow(base, exponent):
+    if _is_array(base, exponent):
+        return np.power(np.asarray(base, dtype=float), exponent)
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+        # Refuse before computing: 9**9**9 would otherwise run for minutes.
+        if exponent * math.log2(abs(base)) > MAX_INT_BITS:
+            raise ExpressionError("Exponent too large")
+    return _check_int(operator.pow(base, exponent))
+
+def _mul(left, right):
+    if isinstance(left, int) and isinstance(right, int):
+        if left.bit_length() + right.bit_length() > MAX_INT_BITS + 1:
+            raise ExpressionError("Result too large")
+    return operator.mul(left, right)
+
+def _factorial(n):
+    n = _as_int(n, 'factorial')
+    if n > MAX_FACTORIAL:
+        raise ExpressionError(f"factorial argument above {MAX_FACTORIAL}")
+    return math.factorial(n)
+
+def _combinatoric(func: Callable, name: str):
+    def call(n, k=None):
+        n = _as_int(n, name)
+        if n > MAX_COMBINATORIC_N:
+            raise ExpressionError(f"{name} argument above {MAX_COMBINATORIC_N}")
+        if k is None:
+            return func(n)
+        return _check_int(func(n, _as_int(k, name)))
+    return call
+
+def _log(x, base=None):
+    if _is_array(x, base):
+        return np.log(x) if base is None else np.log(x) / np.log(base)
+    return math.log(x) if base is None else math.log(x, base)
+
+def _dispatch(scalar: Callable, vector: Callable) -> Callable:
+    def call(*args):
+        return vector(*args) if _is_array(*args) else scalar(*args)
+    return call
+
+def _arange(start, stop=None, step=1):
+    if stop is None:
+        start, stop = 0, start
+    if step == 0:
+        raise ExpressionError("range step cannot be zero")
+    _check_table_size(math.ceil((stop - start) / step))
+    return np.arange(start, stop, step)
+
+def _linspace(start, stop, num=50):
+    num = _as_int(num, 'linspace')
+    _check_table_size(num)
+    return np.linspace(start, stop, num)
+
+def _check_table_size(size: int):
+    if size > MAX_TABLE_SIZE:
+        raise ExpressionError(f"Range larger than {MAX_TABLE_SIZE} points")
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _pow,
+}
+
+UNARY_OPERATORS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+CONSTANTS = {
+    'pi': math.pi,
+    'e': math.e,
+    'tau': math.tau,
+    'inf': math.inf,
+}
+
+FUNCTIONS = {
+    'sqrt': _dispatch(math.sqrt, np.sqrt),
+    'abs': _dispatch(abs, np.abs),
+    'pow': _pow,
+    'exp': _dispatch(math.exp, np.exp),
+    'log': _log,
+    'ln': _dispatch(math.log, np.log),
+    'log10': _dispatch(math.log10, np.log10),
+    'log2': _dispatch(math.log2, np.log2),
+    'sin': _dispatch(math.sin, np.sin),
+    'cos': _dispatch(math.cos, np.cos),
+    'tan': _dispatch(math.tan, np.tan),
+    'asin': _dispatch(math.asin, np.arcsin),
+    'acos': _dispatch(math.acos, np.arccos),
+    'atan': _dispatch(math.atan, np.arctan),
+    'atan2': _dispatch(math.atan2, np.arctan2),
+    'sinh': _dispatch(math.sinh, np.sinh),
+    'cosh': _dispatch(math.cosh, np.cosh),
+    'tanh': _dispatch(math.tanh, np.tanh),
+    'degrees': _dispatch(math.degrees, np.degrees),
+    'radians': _dispatch(math.radians, np.radians),
+    'floor': _dispatch(math.floor, np.floor),
+    'ceil': _dispatch(math.ceil, np.ceil),
+    'round': _dispatch(round, np.round),
+    'factorial': _dispatch(_factorial, np.vectorize(_factorial, otypes=[object])),
+    'comb': _dispatch(_combinatoric(math.comb, 'comb'), np.vectorize(_combinatoric(math.comb, 'comb'), otypes=[object])),
+    'perm': _dispatch(_combinatoric(math.perm, 'perm'), np.vectorize(_combinatoric(math.perm, 'perm'), otypes=[object])),
+    'gcd': _dispatch(lambda a, b: math.gcd(_as_int(a, 'gcd'), _as_int(b, 'gcd')), np.gcd),
+    'lcm': _dispatch(lambda a, b: math.lcm(_as_int(a, 'lcm'), _as_int(b, 'lcm')), np.lcm),
+    'min': _dispatch(min, np.minimum),
+    'max': _dispatch(max, np.maximum),
+}
+FUNCTIONS['nCr'] = FUNCTIONS['comb']
+FUNCTIONS['nPr'] = FUNCTIONS['perm']
+
+DOMAIN_FUNCTIONS = {**FUNCTIONS, 'range': _arange, 'linspace': _linspace}
+
+def normalize_expression(expr: str) -> str:
+    expr = expr.strip().rstrip('=?').strip()
+    for symbol, replacement in (('^', '**'), ('√', 'sqrt'), ('×', '*'), ('÷', '/'), ('−', '-'), ('π', 'pi')):
+        expr = expr.replace(symbol, replacement)
+    return expr
+
+def _compile_node(node: ast.AST, functions: Dict[str, Callable], budget: list) -> Callable[[Dict], object]:
+    # Builds a closure tree once per expression; evaluating it is just calls.
+    budget[0] -= 1
+    if budget[0] < 0:
+        raise ExpressionError("Expression too complex")
+
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body, functions, budget)
+
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ExpressionError(f"Unsupported constant: {node.value!r}")
+        value = node.value
+        return lambda env: value
+
+    if isinstance(node, ast.BinOp):
+        op = BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        left = _compile_node(node.left, functions, budget)
+        right = _compile_node(node.right, functions, budget)
+        return lambda env: op(left(env), right(env))
+
+    if isinstance(node, ast.UnaryOp):
+        op = UNARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        operand = _compile_node(node.operand, functions, budget)
+        return lambda env: op(operand(env))
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in functions or node.keywords:
+            name = node.func.id if isinstance(node.func, ast.Name) else type(node.func).__name__
+            raise ExpressionError(f"Unsupported function: {name}")
+        func = functions[node.func.id]
+        args = [_compile_node(arg, functions, budget) for arg in node.args]
+        return lambda env: func(*[arg(env) for arg in args])
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in CONSTANTS:
+            value = CONSTANTS[name]
+            return lambda env: value
+
+        def lookup(env):
+            if name not in env:
+                raise ExpressionError(f"Unknown name: {name}")
+            return env[name]
+        return lookup
+
+    if isinstance(node, (ast.List, ast.Tuple)):
+        elements = [_compile_node(element, functions, budget) for element in node.elts]
+        return lambda env: np.array([element(env) for element in elements], dtype=float)
+
+    raise ExpressionError(f"Unsupported operation: {type(node).__name__}")
+
+class ExpressionEngine:
+    # Safe evaluator for CALCULATE expressions. Parsed expressions are compiled to
+    # closures and kept in an LRU cache; "<expr> for x in range(...)" or
+    # "... in linspace(a, b, n)" tabulates the expression over NumPy arrays.
+    def __init__(self, cache_size: int = 1024):
+        self._compile = lru_cache(maxsize=cache_size)(self._compile_uncached)
+
+    def _compile_uncached(self, expr: str, domain: bool = False) -> Callable[[Dict], object]:
+        if len(expr) > MAX_EXPRESSION_LENGTH:
+            raise ExpressionError("Expression too long")
+        try:
+            tree = ast.parse(expr, mode='eval')
+        except SyntaxError:
+            raise ExpressionError(f"Cannot parse: {expr}")
+        return _compile_node(tree, DOMAIN_FUNCTIONS if domain else FUNCTIONS, [MAX_NODES])
+
+    def evaluate(self, expr: str, variables: Optional[Dict[str, object]] = None):
+        try:
+            return self._compile(normalize_expression(expr))(variables or {})
+        except ExpressionError:
+            raise
+        except (ArithmeticError, ValueError, TypeError) as e:
+            raise ExpressionError(str(e) or type(e).__name__)
+
+    def tabulate(self, expr: str) -> Tuple[str, np.ndarray, np.ndarray]:
+        match = TABLE_PATTERN.match(normalize_expression(expr))
+        if not match:
+            raise ExpressionError(f"Not a tabulation: {expr}")
+        var = match.group('var')
+        try:
+            xs = np.asarray(self._compile(match.group('domain'), domain=True)({}), dtype=float)
+            with np.errstate(all='ignore'):
+                ys = np.broadcast_to(self._compile(match.group('expr'))({var: xs}), xs.shape)
+        except ExpressionError:
+            raise
+        except (ArithmeticError, ValueError, TypeError) as e:
+            raise ExpressionError(str(e) or type(e).__name__)
+        return var, xs, ys
+
+    def calculate(self, expr: str) -> str:
+        if TABLE_PATTERN.match(normalize_expression(expr)):
+            var, xs, ys = self.tabulate(expr)
+            return '; '.join(f"{var}={format_number(x)}: {format_number(y)}" for x, y in zip(xs, ys))
+        return format_number(self.evaluate(expr))
+
+def format_number(value) -> str:
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return f"{value:.10g}"
+    if isinstance(value, np.ndarray):
+        return '[' + ', '.join(format_number(v) for v in value.tolist()) + ']'
+    return str(value)
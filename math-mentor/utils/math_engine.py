@@ -0,0 +1,537 @@
+import re
+import string
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import sympy
+from sympy.parsing.sympy_parser import (
+    convert_xor,
+    implicit_multiplication_application,
+    parse_expr,
+    rationalize,
+    standard_transformations,
+)
+
+# Router strategy for problems the engine can solve without the LLM.
+STRATEGY = 'symbolic_computation'
+
+MAX_TEXT_LENGTH = 300
+MAX_EXPONENT = 100
+MAX_LITERAL = 10 ** 12
+MAX_FACTORIAL = 1000
+MAX_MATRIX_SIZE = 6
+MAX_OPS = 60
+MAX_DEGREE = 4
+
+# rationalize keeps decimals exact: 0.5x = 2 gives x = 4, not 4.00000000000000.
+TRANSFORMATIONS = standard_transformations + (implicit_multiplication_application, convert_xor, rationalize)
+
+def _log(arg, base=None, **options):
+    # A bare log(x) is base 10 to most students and base e to SymPy; leave it to
+    # the LLM. ln(x) and log(x, b) are unambiguous.
+    if base is None:
+        raise NotSolvable('log')
+    return sympy.log(arg, base, **options)
+
+FUNCTIONS = {
+    'sin': sympy.sin, 'cos': sympy.cos, 'tan': sympy.tan,
+    'sec': sympy.sec, 'csc': sympy.csc, 'cot': sympy.cot,
+    'asin': sympy.asin, 'acos': sympy.acos, 'atan': sympy.atan,
+    'arcsin': sympy.asin, 'arccos': sympy.acos, 'arctan': sympy.atan,
+    'sinh': sympy.sinh, 'cosh': sympy.cosh, 'tanh': sympy.tanh,
+    'exp': sympy.exp, 'log': _log, 'ln': sympy.log, 'sqrt': sympy.sqrt,
+    'abs': sympy.Abs, 'factorial': sympy.factorial,
+    'binomial': sympy.binomial, 'comb': sympy.binomial, 'nCr': sympy.binomial,
+    'perm': sympy.ff, 'nPr': sympy.ff,
+    'pi': sympy.pi, 'oo': sympy.oo,
+}
+SYMBOLS = {letter: sympy.Symbol(letter) for letter in string.ascii_letters}
+LOCALS = {**SYMBOLS, 'e': sympy.E, **FUNCTIONS}
+
+ALLOWED_TEXT = re.compile(r'^[\w\s+\-*/^().,!\[\]]*$')
+IDENTIFIER = re.compile(r'[A-Za-z_]\w*')
+LITERAL = re.compile(r'\d+(?:\.\d+)?')
+FACTORIAL_ARGUMENT = re.compile(r'(?:(\d+)\s*!|(?:factorial|binomial|comb|nCr|perm|nPr)\s*\(\s*(\d+))')
+
+PREFIX = r'^(?:please\s+)?(?:(?:find|compute|calculate|evaluate|determine|what\s+is|give)\s+)?(?:the\s+)?'
+VARIABLE = r'(?:\s+(?:with\s+respect\s+to|w\.?\s*r\.?\s*t\.?)\s+(?P<var>[a-z]))?'
+ORDERS = {'first': 1, 'second': 2, 'third': 3, '2nd': 2, '3rd': 3, '2': 2, '3': 3}
+DERIVATIVE = re.compile(
+    PREFIX + r'(?:(?P<order>first|second|third|2nd|3rd)\s+)?derivative\s+of\s+(?P<expr>.+?)' + VARIABLE + r'$', re.I)
+DIFFERENTIATE = re.compile(r'^(?:please\s+)?differentiate\s+(?P<expr>.+?)' + VARIABLE + r'$', re.I)
+LEIBNIZ = re.compile(r'^d(?:\^?(?P<order>[23]))?\s*/\s*d(?P<var>[a-z])(?:\^?[23])?\s*(?P<expr>.+)$')
+INTEGRAL = re.compile(
+    PREFIX + r'(?:(?:definite|indefinite)\s+)?(?:integral\s+of|integrate|∫)\s*(?P<expr>.+)$', re.I)
+BOUNDS = re.compile(r'\s+(?:from|between)\s+(?P<lower>\S+?)\s+(?:to|and)\s+(?P<upper>\S+?)$', re.I)
+DIFFERENTIAL = re.compile(r'(?:^|(?<=[\s)*]))d(?P<var>[a-z])$')
+LIMIT = re.compile(
+    PREFIX + r'lim(?:it)?\s+(?:of\s+)?(?P<expr>.+?)\s+as\s+(?P<var>[a-z])\s*(?:->|→|approaches|tends\s+to|goes\s+to)\s*(?P<point>.+)$', re.I)
+LIMIT_PREFIXED = re.compile(
+    PREFIX + r'lim(?:it)?\s*_?\s*\(?\s*(?P<var>[a-z])\s*(?:->|→)\s*(?P<point>[^\s)]+)\s*\)?\s+(?:of\s+)?(?P<expr>.+)$', re.I)
+MATRIX_OP = re.compile(r'\b(?P<op>determinant|det|inverse|transpose|rank)\b.*?(?P<matrix>\[.*\])', re.I)
+FUNCTION_QUERY = re.compile(
+    r'^(?:(?:if|given|let)\s+)?(?P<fn>[a-z])\s*\(\s*(?P<var>[a-z])\s*\)\s*=\s*(?P<expr>.+?)\s*[,;.]?\s*'
+    r'(?:then\s+)?(?:find|compute|evaluate|calculate|determine|what\s+is)\s+(?:the\s+value\s+of\s+)?'
+    r"(?P=fn)(?P<primes>'*)\s*\(\s*(?P<at>[^)]+)\)$", re.I)
+SOLVE_FOR = re.compile(
+    r'^(?:solve|find|determine)\s+(?:for\s+|the\s+values?\s+of\s+)?(?P<vars>[a-z](?:\s*(?:,|and)\s*[a-z])*)'
+    r'\s*(?::|,|\s(?:if|when|where|such\s+that|given(?:\s+that)?|in|from)\s)\s*(?P<body>.+)$', re.I)
+SOLVE = re.compile(
+    r'^(?:solve|find|determine)(?:\s+the)?(?:\s+(?:equation|system)s?)?(?:\s+of\s+equations)?\s*:?\s*(?P<body>.+)$', re.I)
+SOLVE_SUFFIX = re.compile(r'\s+for\s+(?P<vars>[a-z](?:\s*(?:,|and)\s*[a-z])*)$', re.I)
+TRANSFORM = re.compile(
+    r'^(?:(?P<op>simplify|factori[sz]e|factor|expand|evaluate|compute|calculate|what\s+is|find\s+the\s+value\s+of)\b\s*:?\s*)?(?P<expr>.+)$', re.I)
+FUNCTION_DEFINITION = re.compile(r'^(?:[a-z]\s*\(\s*(?P<var>[a-z])\s*\)|y)\s*=\s*', re.I)
+
+class NotSolvable(ValueError):
+    pass
+
+def normalize_problem(text: str) -> str:
+    # Drop closing punctuation but keep a trailing factorial ("5!").
+    text = re.sub(r'(?:[.?]|(?<![\d)])!)+$', '', text.strip()).strip()
+    for symbol, replacement in (('√', 'sqrt'), ('×', '*'), ('·', '*'), ('÷', '/'), ('−', '-'), ('–', '-'),
+                                ('π', 'pi'), ('∞', 'oo'), ('²', '^2'), ('³', '^3'), ('**', '^')):
+        text = text.replace(symbol, replacement)
+    text = re.sub(r'\binfinity\b|\binf\b', 'oo', text, flags=re.I)
+    # "5C2" / "5P2"
+    text = re.sub(r'\b(\d+)\s*C\s*(\d+)\b', r'binomial(\1, \2)', text)
+    text = re.sub(r'\b(\d+)\s*P\s*(\d+)\b', r'perm(\1, \2)', text)
+    return re.sub(r'\s+', ' ', text)
+
+def parse_expression(text: str, variables: Tuple[str, ...] = ()) -> sympy.Expr:
+    # parse_expr evaluates Python, so only arithmetic characters, known function
+    # names and single-letter variables get through, and anything that could
+    # blow up (huge literals, towers of powers, big factorials) is refused.
+    text = text.strip()
+    if not text or len(text) > MAX_TEXT_LENGTH or not ALLOWED_TEXT.match(text) or '__' in text:
+        raise NotSolvable(text)
+    letters = {v for v in variables if len(v) == 1}
+    for name in IDENTIFIER.findall(text):
+        if name not in LOCALS and not (name.isalpha() and set(name) <= letters):
+            raise NotSolvable(name)
+    if any(float(literal) > MAX_LITERAL for literal in LITERAL.findall(text)):
+        raise NotSolvable(text)
+    for match in FACTORIAL_ARGUMENT.finditer(text):
+        if int(match.group(1) or match.group(2)) > MAX_FACTORIAL:
+            raise NotSolvable(text)
+
+    try:
+        unevaluated = parse_expr(text, local_dict=dict(LOCALS), transformations=TRANSFORMATIONS, evaluate=False)
+        _check_tree(unevaluated)
+        expr = parse_expr(text, local_dict=dict(LOCALS), transformations=TRANSFORMATIONS)
+    except NotSolvable:
+        raise
+    except Exception:
+        raise NotSolvable(text)
+    if not isinstance(expr, sympy.Expr) or sympy.count_ops(expr) > MAX_OPS:
+        raise NotSolvable(text)
+    return expr
+
+def parse_equations(text: str, variables: Tuple[str, ...] = ()) -> Optional[Tuple[List[Tuple], List[sympy.Symbol]]]:
+    # "Solve for x: 3x + 7 = 22", "x + y = 3, x - y = 1", "2x = 4 for x" ->
+    # ([(lhs, rhs), ...], unknowns). text must already be normalize_problem()'d.
+    if '=' not in text or re.search(r'[<>]', text):
+        return None
+    unknowns = []
+    match = SOLVE_FOR.match(text) or SOLVE.match(text)
+    body = match.group('body') if match else text
+    if match and 'vars' in match.groupdict():
+        unknowns = re.findall(r'[a-z]', match.group('vars'), re.I)
+    suffix = SOLVE_SUFFIX.search(body)
+    if suffix:
+        unknowns = re.findall(r'[a-z]', suffix.group('vars'), re.I)
+        body = body[:suffix.start()]
+
+    parts = [part for part in re.split(r'\s*(?:;|,|\band\b)\s*', body) if part]
+    if not parts or len(parts) > 4 or any(part.count('=') != 1 for part in parts):
+        return None
+    equations = []
+    for part in parts:
+        lhs, rhs = part.split('=')
+        equations.append((parse_expression(lhs, variables), parse_expression(rhs, variables)))
+
+    free = sorted(set().union(*[(l - r).free_symbols for l, r in equations]), key=str)
+    if unknowns:
+        symbols = [sympy.Symbol(name) for name in unknowns]
+    elif len(free) == len(equations):
+        symbols = free
+    else:
+        symbols = [sympy.Symbol(name) for name in variables if sympy.Symbol(name) in free]
+        if len(symbols) != len(equations):
+            return None
+    if not symbols:
+        return None
+    return equations, symbols
+
+def parse_matrix(text: str, variables: Tuple[str, ...] = ()) -> sympy.Matrix:
+    # [[1, 2], [3, 4]] or [1 2; 3 4]
+    rows = re.findall(r'\[([^\[\]]*)\]', text)
+    if len(rows) > 1 or text.count('[') > 1:
+        cells = [re.split(r'\s*,\s*|\s+', row.strip()) for row in rows]
+    else:
+        cells = [re.split(r'\s*,\s*|\s+', row.strip()) for row in rows[0].split(';')] if rows else []
+    if not cells or len(cells) > MAX_MATRIX_SIZE or len({len(row) for row in cells}) != 1 or len(cells[0]) > MAX_MATRIX_SIZE:
+        raise NotSolvable(text)
+    return sympy.Matrix([[parse_expression(cell, variables) for cell in row] for row in cells])
+
+def _check_tree(expr):
+    for node in sympy.preorder_traversal(expr):
+        if isinstance(node, sympy.Pow):
+            exponent = node.exp
+            if exponent.is_Number and abs(exponent) > MAX_EXPONENT:
+                raise NotSolvable(str(node))
+            if not exponent.free_symbols and not exponent.is_Number and exponent.has(sympy.Pow):
+                raise NotSolvable(str(node))
+
+def fmt(expr) -> str:
+    if isinstance(expr, sympy.MatrixBase):
+        return '[' + ', '.join('[' + ', '.join(fmt(v) for v in row) + ']' for row in expr.tolist()) + ']'
+    # Natural logs are written ln(...) so they cannot be read as base 10.
+    return re.sub(r'\blog\(', 'ln(', sympy.sstr(expr).replace('**', '^'))
+
+def fmt_value(expr) -> str:
+    # Exact form, with a decimal approximation for irrational or fractional values.
+    text = fmt(expr)
+    if isinstance(expr, sympy.Expr) and expr.is_number and not expr.is_Integer and expr.is_real:
+        approx = f"{float(sympy.N(expr)):.6g}"
+        if approx != text:
+            return f"{text} ≈ {approx}"
+    return text
+
+def _pick_variable(expr, variable: Optional[str], hints: Tuple[str, ...]) -> sympy.Symbol:
+    free = sorted(expr.free_symbols, key=str)
+    if variable:
+        return sympy.Symbol(variable)
+    if len(free) == 1:
+        return free[0]
+    for name in hints + ('x', 't'):
+        if sympy.Symbol(name) in free:
+            return sympy.Symbol(name)
+    if not free:
+        return sympy.Symbol('x')
+    raise NotSolvable('ambiguous variable')
+
+def _strip_definition(text: str) -> Tuple[str, Optional[str]]:
+    match = FUNCTION_DEFINITION.match(text)
+    if match:
+        return text[match.end():], match.group('var')
+    return text, None
+
+def _terms(expr) -> List:
+    return list(sympy.Add.make_args(expr))
+
+class MathEngine:
+    # Exact solver for the problem shapes that make up most traffic: equations and
+    # small systems, derivatives, integrals, limits, matrix determinant / inverse /
+    # transpose / rank, and plain evaluation or simplification. solve() returns
+    # None for anything else so the caller can fall back to the LLM. Results are
+    # memoised, so the router's check and the solver's call share one computation.
+    def __init__(self, cache_size: int = 512):
+        self._solve = lru_cache(maxsize=cache_size)(self._solve_uncached)
+
+    def solve(self, parsed_problem: Dict) -> Optional[Dict]:
+        text = parsed_problem.get('problem_text') or ''
+        variables = tuple(str(v) for v in parsed_problem.get('variables') or [] if isinstance(v, str))
+        if not text or len(text) > MAX_TEXT_LENGTH * 2:
+            return None
+        return self._solve(text, variables)
+
+    def _solve_uncached(self, text: str, variables: Tuple[str, ...]) -> Optional[Dict]:
+        text = normalize_problem(text)
+        for task in (self._matrix, self._function_query, self._derivative, self._integral,
+                     self._limit, self._equations, self._transform):
+            try:
+                result = task(text, variables)
+            except (NotSolvable, NotImplementedError, ValueError, TypeError, ZeroDivisionError, AttributeError):
+                # sympy raises several error types for input it cannot handle.
+                return None
+            if result is not None:
+                steps = [f"Step {i}: {step}" for i, step in enumerate(result['steps'], 1)]
+                solution = '\n'.join(
+                    ["Solved exactly with the symbolic math engine.", ""] + steps + ["", f"Final Answer: {result['answer']}"]
+                )
+                # value is the exact answer as a SymPy object, for checking other solutions against.
+                return {'task': result['task'], 'answer': result['answer'], 'steps': steps, 'solution': solution,
+                        'value': result.get('value'), 'symbol': result.get('symbol'),
+                        'indefinite': result.get('indefinite', False)}
+        return None
+
+    def _equations(self, text: str, variables: Tuple[str, ...]) -> Optional[Dict]:
+        parsed = parse_equations(text, variables)
+        if parsed is None:
+            return None
+        equations, symbols = parsed
+        for lhs, rhs in equations:
+            expr = lhs - rhs
+            if not expr.is_polynomial(*symbols) or sympy.Poly(expr, *symbols).total_degree() > MAX_DEGREE:
+                return None
+
+        if len(equations) == 1:
+            return self._single_equation(equations[0], symbols[0])
+        return self._system(equations, symbols)
+
+    def _single_equation(self, equation, symbol) -> Optional[Dict]:
+        lhs, rhs = equation
+        expr = sympy.expand(lhs - rhs)
+        name = fmt(symbol)
+        steps = [f"Write the equation: {fmt(lhs)} = {fmt(rhs)}"]
+        if expr == 0:
+            return {'task': 'equation', 'answer': f"All values of {name} satisfy the equation", 'steps': steps + ["Both sides are identical."]}
+
+        poly = sympy.Poly(expr, symbol)
+        degree = poly.degree()
+        if degree == 0:
+            return {'task': 'equation', 'answer': "No solution", 'value': [], 'symbol': symbol,
+                    'steps': steps + [f"Moving all terms to one side leaves {fmt(expr)} = 0, which is never true."]}
+        if degree == 1:
+            a, b = poly.all_coeffs()
+            if b != 0:
+                steps.append(f"Move the constant terms to the right side: {fmt(a * symbol)} = {fmt(-b)}")
+            else:
+                steps.append(f"Collect the terms in {name}: {fmt(a * symbol)} = 0")
+            if a != 1:
+                steps.append(f"Divide both sides by {fmt(a)}: {name} = {fmt(-b / a)}")
+        else:
+            steps.append(f"Move all terms to one side: {fmt(expr)} = 0")
+            factored = sympy.factor(expr)
+            if degree == 2:
+                a, b, c = poly.all_coeffs()
+                if factored != expr and len(sympy.Mul.make_args(factored)) > 1:
+                    steps.append(f"Factor: {fmt(factored)} = 0")
+                    steps.append("Set each factor equal to zero.")
+                else:
+                    discriminant = sympy.simplify(b ** 2 - 4 * a * c)
+                    steps.append(f"Use the quadratic formula with a = {fmt(a)}, b = {fmt(b)}, c = {fmt(c)}")
+                    steps.append(f"Discriminant: b^2 - 4ac = {fmt(discriminant)}")
+            elif factored != expr:
+                steps.append(f"Factor: {fmt(factored)} = 0")
+
+        roots = sympy.solve(expr, symbol)
+        real = [root for root in roots if root.is_real is not False]
+        if not real:
+            answer = f"No real solution (complex roots: {', '.join(f'{name} = {fmt(root)}' for root in roots)})"
+        else:
+            answer = ', '.join(f"{name} = {fmt_value(root)}" for root in real)
+            if degree > 1:
+                steps.append(f"Solve for {name}: {', '.join(f'{name} = {fmt(root)}' for root in real)}")
+            checks = [f"{name} = {fmt(root)} gives {fmt(sympy.simplify(lhs.subs(symbol, root)))} = "
+                      f"{fmt(sympy.simplify(rhs.subs(symbol, root)))}" for root in real[:2]]
+            steps.append(f"Check by substituting back: {'; '.join(checks)}")
+        return {'task': 'equation', 'answer': answer, 'steps': steps, 'value': real, 'symbol': symbol}
+
+    def _system(self, equations, symbols) -> Optional[Dict]:
+        steps = ["Write the system: " + '; '.join(f"{fmt(l)} = {fmt(r)}" for l, r in equations)]
+        linear = all(sympy.Poly(l - r, *symbols).total_degree() <= 1 for l, r in equations)
+        solutions = sympy.solve([sympy.Eq(l, r) for l, r in equations], symbols, dict=True)
+        if linear:
+            matrix, vector = sympy.linear_eq_to_matrix([l - r for l, r in equations], symbols)
+            steps.append(f"Write it in matrix form A·v = b with A = {fmt(matrix)}, b = {fmt(vector.T)}")
+            if matrix.shape[0] == matrix.shape[1]:
+                steps.append(f"det(A) = {fmt(matrix.det())}")
+            steps.append("Eliminate variables to reduce the system and back-substitute.")
+        else:
+            steps.append("Substitute one equation into the others and solve the resulting polynomial.")
+        if not solutions:
+            return {'task': 'system', 'answer': "No solution", 'value': [], 'steps': steps + ["The equations are inconsistent."]}
+        if any(len(solution) < len(symbols) for solution in solutions):
+            return None
+        answer = ' or '.join(', '.join(f"{fmt(s)} = {fmt_value(solution[s])}" for s in symbols) for solution in solutions)
+        steps.append(f"Solution: {answer}")
+        return {'task': 'system', 'answer': answer, 'steps': steps, 'value': solutions}
+
+    def _function_query(self, text: str, variables: Tuple[str, ...]) -> Optional[Dict]:
+        match = FUNCTION_QUERY.match(text)
+        if not match:
+            return None
+        fn, var = match.group('fn'), sympy.Symbol(match.group('var'))
+        expr = parse_expression(match.group('expr'), variables)
+        order = len(match.group('primes'))
+        at = parse_expression(match.group('at'), variables)
+        name = f"{fn}{chr(39) * order}"
+
+        steps = [f"Start from {fn}({var}) = {fmt(expr)}"]
+        if order:
+            result = expr
+            for i in range(1, order + 1):
+                result = sympy.simplify(sympy.diff(result, var))
+                steps.append(f"Differentiate: {fn}{chr(39) * i}({var}) = {fmt(result)}")
+        else:
+            result = expr
+        if at == var:
+            return {'task': 'derivative', 'answer': f"{name}({var}) = {fmt(result)}", 'steps': steps, 'value': result, 'symbol': var}
+        value = sympy.simplify(result.subs(var, at))
+        steps.append(f"Substitute {var} = {fmt(at)}: {name}({fmt(at)}) = {fmt(value)}")
+        return {'task': 'derivative' if order else 'evaluation', 'answer': f"{name}({fmt(at)}) = {fmt_value(value)}", 'steps': steps, 'value': value}
+
+    def _derivative(self, text: str, variables: Tuple[str, ...]) -> Optional[Dict]:
+        match = DERIVATIVE.match(text) or DIFFERENTIATE.match(text) or LEIBNIZ.match(text)
+        if not match:
+            return None
+        groups = match.groupdict()
+        body, defined = _strip_definition(match.group('expr').strip())
+        expr = parse_expression(body, variables)
+        symbol = _pick_variable(expr, groups.get('var') or defined, variables)
+        order = ORDERS.get((groups.get('order') or '').lower(), 1)
+
+        steps = [f"Differentiate {fmt(expr)} with respect to {symbol}"]
+        result = expr
+        for i in range(order):
+            terms = _terms(result)
+            if len(terms) > 1:
+                steps.append("Differentiate term by term: " + ', '.join(
+                    f"d/d{symbol}({fmt(term)}) = {fmt(sympy.diff(term, symbol))}" for term in terms))
+            result = sympy.diff(result, symbol)
+            simplified = sympy.simplify(result)
+            if sympy.count_ops(simplified) < sympy.count_ops(result):
+                result = simplified
+            steps.append(f"{'Derivative' if order == 1 else f'Derivative {i + 1}'}: {fmt(result)}")
+        operator = f"d/d{symbol}" if order == 1 else f"d^{order}/d{symbol}^{order}"
+        return {'task': 'derivative', 'answer': f"{operator} ({fmt(expr)}) = {fmt(result)}", 'steps': steps, 'value': result, 'symbol': symbol}
+
+    def _integral(self, text: str, variables: Tuple[str, ...]) -> Optional[Dict]:
+        match = INTEGRAL.match(text)
+        if not match:
+            return None
+        body = match.group('expr').strip()
+        bounds = BOUNDS.search(body)
+        lower = upper = None
+        if bounds:
+            lower, upper = bounds.group('lower'), bounds.group('upper')
+            body = body[:bounds.start()].strip()
+        variable = None
+        differential = DIFFERENTIAL.search(body)
+        if differential:
+            variable = differential.group('var')
+            body = body[:differential.start()].strip()
+        body, defined = _strip_definition(body)
+        expr = parse_expression(body, variables)
+        symbol = _pick_variable(expr, variable or defined, variables)
+
+        antiderivative = sympy.integrate(expr, symbol)
+        if antiderivative.has(sympy.Integral):
+            return None
+        steps = [f"Integrate {fmt(expr)} with respect to {symbol}"]
+        terms = _terms(expr)
+        if len(terms) > 1:
+            steps.append("Integrate term by term: " + ', '.join(
+                f"∫{fmt(term)} d{symbol} = {fmt(sympy.integrate(term, symbol))}" for term in terms))
+        steps.append(f"Antiderivative: F({symbol}) = {fmt(antiderivative)}")
+        if lower is None:
+            return {'task': 'integral', 'answer': f"{fmt(antiderivative)} + C", 'steps': steps,
+                    'value': antiderivative, 'symbol': symbol, 'indefinite': True}
+
+        a, b = parse_expression(lower, variables), parse_expression(upper, variables)
+        value = sympy.simplify(sympy.integrate(expr, (symbol, a, b)))
+        if value.has(sympy.Integral) or value.has(sympy.nan):
+            return None
+        upper_value = sympy.simplify(antiderivative.subs(symbol, b))
+        lower_value = sympy.simplify(antiderivative.subs(symbol, a))
+        steps.append(f"Evaluate F({fmt(b)}) - F({fmt(a)}) = {fmt(upper_value)} - ({fmt(lower_value)}) = {fmt(value)}")
+        return {'task': 'integral', 'answer': fmt_value(value), 'steps': steps, 'value': value}
+
+    def _limit(self, text: str, variables: Tuple[str, ...]) -> Optional[Dict]:
+        match = LIMIT.match(text) or LIMIT_PREFIXED.match(text)
+        if not match:
+            return None
+        body, _ = _strip_definition(match.group('expr').strip())
+        expr = parse_expression(body, variables)
+        symbol = sympy.Symbol(match.group('var'))
+        point = parse_expression(match.group('point'), variables)
+
+        steps = [f"Find the limit of {fmt(expr)} as {symbol} → {fmt(point)}"]
+        value = sympy.limit(expr, symbol, point)
+        if isinstance(value, sympy.Limit) or value.has(sympy.AccumBounds):
+            return None
+        direct = expr.subs(symbol, point) if point.is_finite else None
+        if direct is not None and direct.is_finite and not direct.has(sympy.nan, sympy.zoo):
+            steps.append(f"Direct substitution gives {fmt(sympy.simplify(direct))}")
+        else:
+            simplified = sympy.cancel(sympy.simplify(expr))
+            if simplified != expr:
+                steps.append(f"Substitution gives an indeterminate form; simplify to {fmt(simplified)}")
+            else:
+                steps.append("Substitution gives an indeterminate form; compare the growth of numerator and denominator")
+        steps.append(f"Limit: {fmt(value)}")
+        return {'task': 'limit', 'answer': fmt_value(value), 'steps': steps, 'value': value}
+
+    def _matrix(self, text: str, variables: Tuple[str, ...]) -> Optional[Dict]:
+        match = MATRIX_OP.search(text)
+        if not match:
+            return None
+        matrix = parse_matrix(match.group('matrix'), variables)
+        op = match.group('op').lower()
+        steps = [f"Matrix A = {fmt(matrix)}"]
+
+        if op in ('determinant', 'det'):
+            if not matrix.is_square:
+                return None
+            value = sympy.simplify(matrix.det())
+            if matrix.shape == (2, 2):
+                (a, b), (c, d) = matrix.tolist()
+                steps.append(f"For a 2x2 matrix, det(A) = ad - bc = ({fmt(a)})({fmt(d)}) - ({fmt(b)})({fmt(c)})")
+            elif matrix.shape == (3, 3):
+                terms = [f"({fmt(matrix[0, j])})·({fmt(matrix.minor(0, j))})" for j in range(3)]
+                steps.append(f"Expand along the first row: det(A) = {terms[0]} - {terms[1]} + {terms[2]}")
+            else:
+                steps.append("Row-reduce A to upper triangular form and multiply the diagonal entries.")
+            steps.append(f"det(A) = {fmt(value)}")
+            return {'task': 'determinant', 'answer': f"det(A) = {fmt(value)}", 'steps': steps, 'value': value}
+        if op == 'inverse':
+            if not matrix.is_square:
+                return None
+            det = sympy.simplify(matrix.det())
+            steps.append(f"det(A) = {fmt(det)}")
+            if det == 0:
+                return {'task': 'inverse', 'answer': "A is singular (det(A) = 0), so it has no inverse",
+                        'steps': steps + ["A matrix with zero determinant is not invertible."]}
+            inverse = sympy.simplify(matrix.inv())
+            steps.append(f"A^-1 = adj(A) / det(A) = {fmt(inverse)}")
+            return {'task': 'inverse', 'answer': f"A^-1 = {fmt(inverse)}", 'steps': steps, 'value': inverse}
+        if op == 'transpose':
+            steps.append("Swap rows and columns.")
+            return {'task': 'transpose', 'answer': f"A^T = {fmt(matrix.T)}", 'steps': steps, 'value': matrix.T}
+        rref, pivots = matrix.rref()
+        steps.append(f"Row-reduce: {fmt(rref)}")
+        steps.append(f"Count the pivot columns: {len(pivots)}")
+        return {'task': 'rank', 'answer': f"rank(A) = {len(pivots)}", 'steps': steps, 'value': sympy.Integer(len(pivots))}
+
+    def _transform(self, text: str, variables: Tuple[str, ...]) -> Optional[Dict]:
+        if '=' in text:
+            return None
+        match = TRANSFORM.match(text)
+        op = (match.group('op') or '').lower()
+        expr = parse_expression(match.group('expr'), variables)
+        steps = [f"Expression: {fmt(expr)}"]
+
+        if op.startswith('factor'):
+            result = sympy.factor(expr)
+            steps.append(f"Factor: {fmt(result)}")
+            return {'task': 'factor', 'answer': fmt(result), 'steps': steps, 'value': result}
+        if op == 'expand':
+            result = sympy.expand(expr)
+            steps.append(f"Expand the products and collect like terms: {fmt(result)}")
+            return {'task': 'expand', 'answer': fmt(result), 'steps': steps, 'value': result}
+        if op == 'simplify':
+            result = sympy.simplify(expr)
+            steps.append(f"Simplify: {fmt(result)}")
+            return {'task': 'simplify', 'answer': fmt(result), 'steps': steps, 'value': result}
+        # Plain evaluation only makes sense for a closed expression.
+        if expr.free_symbols or not expr.is_number:
+            return None
+        value = sympy.simplify(expr)
+        if value.has(sympy.nan, sympy.zoo):
+            return None
+        steps.append(f"Evaluate: {fmt_value(value)}")
+        return {'task': 'evaluation', 'answer': fmt_value(value), 'steps': steps, 'value': value}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_math_engine() -> MathEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = MathEngine()
+    return _engine
@@ -0,0 +1,35 @@
+import hashlib
+import os
+from typing import Callable, Dict, Optional
+from utils.cache import DiskCache, LRUCache, TieredCache
+
+class MediaResultCache:
+    # Caches OCR / transcription results by a hash of the uploaded bytes plus the
+    # processor's model/config version, so Streamlit reruns and repeat uploads
+    # skip the model entirely.
+    def __init__(self, memory_entries: int = 64, disk_path: Optional[str] = 'data/media_cache.sqlite',
+                 disk_entries: int = 5000, ttl: Optional[float] = 30 * 24 * 3600):
+        disk = DiskCache(disk_path, max_entries=disk_entries, ttl=ttl) if disk_path else None
+        self.cache = TieredCache(LRUCache(max_entries=memory_entries, ttl=ttl), disk)
+
+    def make_key(self, data: bytes, kind: str, version: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{kind}:{version}:".encode('utf-8'))
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get_or_compute(self, data: bytes, kind: str, version: str, compute: Callable[[], Dict]) -> Dict:
+        key = self.make_key(data, kind, version)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {**cached, 'cached': True}
+
+        result = compute()
+        # Failed extractions are not cached so a retry can succeed.
+        if result.get('text'):
+            self.cache.set(key, result)
+        return {**result, 'cached': False}
+
+def create_media_cache() -> MediaResultCache:
+    disk_path = os.getenv('MEDIA_CACHE_PATH', 'data/media_cache.sqlite')
+    return MediaResultCache(disk_path=disk_path or None)
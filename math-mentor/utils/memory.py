@@ -3,82 +3,120 @@
 
 import json
 import os
+import threading
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from collections import Counter
+from utils.text_index import InvertedIndex
+from utils.storage import MemoryStorage, open_storage
 
 class MemorySystem:
-    def __init__(self, memory_file='data/memory.json'):
+    def __init__(self, memory_file='data/memory.jsonl', storage: Optional[MemoryStorage] = None):
         self.memory_file = memory_file
+        self._lock = threading.Lock()
         os.makedirs(os.path.dirname(memory_file), exist_ok=True)
-        self.memories = self._load_memory()
-        self.correction_patterns = self._load_correction_patterns()
+        # The default JSONL log migrates an existing data/memory.json on first use.
+        self.storage = storage if storage is not None else open_storage(memory_file)
+        self.memories = []
+        self.index = InvertedIndex()
+        self.correction_patterns, self.stats = self._empty_aggregates()
+        self._add_memories(self.storage.load())
     
-    def _load_memory(self) -> List[Dict]:
-        if os.path.exists(self.memory_file):
-            with open(self.memory_file, 'r') as f:
-                return json.load(f)
-        return []
+    def _add_memories(self, entries: List[Dict]):
+        for entry in entries:
+            self.memories.append(entry)
+            self._index_memory(len(self.memories) - 1, entry)
+            self._count_memory(self.correction_patterns, self.stats, entry)
     
-    def _save_memory(self):
-        with open(self.memory_file, 'w') as f:
-            json.dump(self.memories, f, indent=2)
+    def _refresh(self):
+        # Picks up feedback appended by other processes sharing the same log.
+        new_entries = self.storage.read_new()
+        if new_entries:
+            self._add_memories(new_entries)
     
-    def _load_correction_patterns(self) -> Dict:
+    def _empty_aggregates(self):
         patterns = {
             'ocr_corrections': {},
             'audio_corrections': {},
             'common_mistakes': Counter(),
             'successful_strategies': Counter()
         }
+        stats = {
+            'correct': 0,
+            'topics': Counter()
+        }
+        return patterns, stats
+    
+    def _count_memory(self, patterns: Dict, stats: Dict, memory: Dict):
+        topic = memory.get('parsed_question', {}).get('topic', 'unknown')
+        stats['topics'][topic] += 1
         
-        for memory in self.memories:
-            if memory.get('user_feedback') == 'incorrect' and memory.get('user_comment'):
-                topic = memory.get('parsed_question', {}).get('topic', 'unknown')
-                patterns['common_mistakes'][topic] += 1
-            
-            if memory.get('user_feedback') == 'correct':
-                strategy = memory.get('routing', {}).get('strategy', 'unknown')
-                patterns['successful_strategies'][strategy] += 1
+        if memory.get('user_feedback') == 'incorrect' and memory.get('user_comment'):
+            patterns['common_mistakes'][topic] += 1
         
-        return patterns
+        if memory.get('user_feedback') == 'correct':
+            stats['correct'] += 1
+            strategy = memory.get('routing', {}).get('strategy', 'unknown')
+            patterns['successful_strategies'][strategy] += 1
+    
+    def check_aggregates(self, rebuild: bool = True) -> bool:
+        # Recomputes the incrementally maintained counters from storage and reports
+        # whether they matched; on mismatch the in-memory state is rebuilt.
+        with self._lock:
+            self._refresh()
+            entries = self.storage.load()
+            patterns, stats = self._empty_aggregates()
+            for entry in entries:
+                self._count_memory(patterns, stats, entry)
+            
+            consistent = (
+                len(entries) == len(self.memories)
+                and stats == self.stats
+                and patterns['common_mistakes'] == self.correction_patterns['common_mistakes']
+                and patterns['successful_strategies'] == self.correction_patterns['successful_strategies']
+            )
+            
+            if not consistent and rebuild:
+                self.memories = []
+                self.index = InvertedIndex()
+                self.correction_patterns, self.stats = self._empty_aggregates()
+                self._add_memories(entries)
+            return consistent
     
     def store(self, entry: Dict):
-        entry['timestamp'] = datetime.now().isoformat()
-        entry['id'] = len(self.memories)
-        self.memories.append(entry)
-        self._save_memory()
-        
-        self.correction_patterns = self._load_correction_patterns()
+        with self._lock:
+            entry['timestamp'] = datetime.now().isoformat()
+            self._add_memories(self.storage.append(entry))
+    
+    def _index_memory(self, position: int, memory: Dict):
+        parsed = memory.get('parsed_question', {})
+        self.index.add(position, parsed.get('problem_text', ''), partition=(parsed.get('topic') or '').lower())
     
     def search_similar(self, problem_text: str, topic: str = None, limit: int = 3) -> List[Dict]:
-        results = []
-        problem_lower = problem_text.lower()
-        problem_words = set(problem_lower.split())
-        
-        for memory in reversed(self.memories):
-            if topic and memory.get('parsed_question', {}).get('topic', '').lower() != topic.lower():
-                continue
-            
-            memory_text = memory.get('parsed_question', {}).get('problem_text', '').lower()
-            memory_words = set(memory_text.split())
-            
-            common_words = problem_words & memory_words
-            similarity = len(common_words) / max(len(problem_words), 1)
-            
-            if similarity > 0.3:
-                results.append({
-                    **memory,
-                    'similarity': similarity
-                })
+        return self.search_similar_many([(problem_text, topic)], limit=limit)[0]
+    
+    def search_similar_many(self, problems: List[Tuple[str, Optional[str]]], limit: int = 3) -> List[List[Dict]]:
+        # One refresh and one pass over the index for a whole batch of (text, topic).
+        partitions = [topic.lower() if topic else None for _, topic in problems]
+        with self._lock:
+            self._refresh()
+            batch = self.index.search_many([text for text, _ in problems], partitions)
         
-        results.sort(key=lambda x: x['similarity'], reverse=True)
-        return results[:limit]
+        similar = []
+        for results in batch:
+            hits = [(position, score, coverage) for position, score, coverage in results if coverage > 0.3]
+            # Highest BM25 first; on ties prefer the most recent memory.
+            hits.sort(key=lambda hit: (hit[1], hit[0]), reverse=True)
+            similar.append([{**self.memories[position], 'similarity': coverage} for position, score, coverage in hits[:limit]])
+        return similar
     
     def get_corrections(self) -> List[Dict]:
         return [m for m in self.memories if m.get('user_feedback') == 'incorrect']
     
     def get_learning_insights(self) -> Dict:
+        with self._lock:
+            self._refresh()
+        
         total = len(self.memories)
         if total == 0:
             return {
@@ -89,17 +127,12 @@ class MemorySystem:
                 'common_error_topics': []
             }
         
-        correct = sum(1 for m in self.memories if m.get('user_feedback') == 'correct')
-        
-        topics = Counter()
-        for m in self.memories:
-            topic = m.get('parsed_question', {}).get('topic', 'unknown')
-            topics[topic] += 1
+        correct = self.stats['correct']
         
         return {
             'total_problems': total,
             'accuracy': (correct / total * 100) if total > 0 else 0,
-            'topics_distribution': dict(topics),
+            'topics_distribution': dict(self.stats['topics']),
             'most_successful_strategy': self.correction_patterns['successful_strategies'].most_common(1)[0][0] if self.correction_patterns['successful_strategies'] else None,
             'common_error_topics': [topic for topic, count in self.correction_patterns['common_mistakes'].most_common(3)]
         }
@@ -1,33 +1,84 @@
-import easyocr
+import threading
+import time
+from importlib.metadata import version
 import numpy as np
 from PIL import Image
+from utils.ocr_preprocess import preprocess_image
 
 # Compatibility fix for Pillow 10.0.0+ where ANTIALIAS was removed
 if not hasattr(Image, 'ANTIALIAS'):
     Image.ANTIALIAS = Image.LANCZOS
 
 class OCRProcessor:
-    def __init__(self):
-        self.reader = easyocr.Reader(['en'], gpu=False)
-    
+    def __init__(self, target_text_height: int = 32, batch_size: int = 16, preprocess: bool = True):
+        self._reader = None
+        self._reader_lock = threading.Lock()
+        self.target_text_height = target_text_height
+        self.batch_size = batch_size
+        self.preprocess = preprocess
+        # Part of the result-cache key: bump when OCR output for the same bytes changes.
+        # Read from package metadata so a cache hit never has to import EasyOCR.
+        self.cache_version = f"easyocr-{version('easyocr')}-en-h{target_text_height}-p{int(preprocess)}"
+
+    @property
+    def reader(self):
+        # EasyOCR (and torch) are imported and the detector loaded on first use.
+        if self._reader is None:
+            with self._reader_lock:
+                if self._reader is None:
+                    import easyocr
+                    self._reader = easyocr.Reader(['en'], gpu=False)
+        return self._reader
+
+    def load(self):
+        return self.reader
+
     def extract_text(self, image):
+        timings = {}
+
         if isinstance(image, Image.Image):
-            image = np.array(image)
-        
-        results = self.reader.readtext(image)
-        
+            image = np.array(image.convert('RGB'))
+
+        if self.preprocess:
+            image, _ = preprocess_image(image, target_text_height=self.target_text_height, timings=timings)
+
+        # Detect all text regions first, then recognise them in batches rather
+        # than one crop at a time.
+        started = time.perf_counter()
+        horizontal_list, free_list = self.reader.detect(image)
+        timings['detect'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = []
+        if horizontal_list[0] or free_list[0]:
+            results = self.reader.recognize(
+                image,
+                horizontal_list=horizontal_list[0],
+                free_list=free_list[0],
+                batch_size=self.batch_size
+            )
+        timings['recognize'] = time.perf_counter() - started
+
         text_parts = []
         confidences = []
-        
+        segments = []
+
         for bbox, text, conf in results:
             text_parts.append(text)
             confidences.append(conf)
-        
+            segments.append({
+                'text': text,
+                'confidence': float(conf),
+                'bbox': [[int(x), int(y)] for x, y in bbox]
+            })
+
         full_text = ' '.join(text_parts)
-        avg_confidence = np.mean(confidences) if confidences else 0.0
-        
+        avg_confidence = float(np.mean(confidences)) if confidences else 0.0
+
         return {
             'text': full_text,
             'confidence': avg_confidence,
-            'needs_review': avg_confidence < 0.7
-        }
\ No newline at end of file
+            'needs_review': avg_confidence < 0.7,
+            'segments': segments,
+            'timings': timings
+        }
@@ -0,0 +1,164 @@
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from PIL import Image
+
+# "1.", "2)", "(3)", "Q4", "Question 5", "Problem 6", "Ex. 7" at the start of a line;
+# "2.5 + 3" is not a marker.
+PROBLEM_MARKER = re.compile(
+    r'^\s*(?:(?:Q(?:uestion)?|Problem|Ex(?:ercise)?)\.?\s*(?P<named>\d+)[.):]?|(?P<number>\d+)\s*[.)](?!\d)|\((?P<paren>\d+)\))\s*',
+    re.IGNORECASE
+)
+
+_worker_processor = None
+
+def _init_worker(ocr_options: Dict, threads_per_worker: int):
+    # Runs once per worker process: the EasyOCR model is loaded here and reused
+    # for every page that worker handles.
+    global _worker_processor
+    import torch
+    torch.set_num_threads(threads_per_worker)
+
+    from utils.ocr import OCRProcessor
+    _worker_processor = OCRProcessor(**ocr_options)
+    _worker_processor.load()
+
+def _ocr_page(source_index: int, page_index: int, image: np.ndarray) -> Dict:
+    result = _worker_processor.extract_text(image)
+    result.update({'source': source_index, 'page': page_index})
+    return result
+
+def _load_pages(source, pdf_dpi: int) -> List[np.ndarray]:
+    # Accepts a path, raw bytes, a file-like upload, a PIL image or an array.
+    if isinstance(source, np.ndarray):
+        return [source]
+    if isinstance(source, Image.Image):
+        return [np.array(source.convert('RGB'))]
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            data = f.read()
+    elif isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+    else:
+        data = source.getvalue() if hasattr(source, 'getvalue') else source.read()
+
+    if data[:5] == b'%PDF-':
+        return _render_pdf(data, pdf_dpi)
+    return [np.array(Image.open(io.BytesIO(data)).convert('RGB'))]
+
+def _render_pdf(data: bytes, dpi: int) -> List[np.ndarray]:
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        pdfium = None
+
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(data)
+        return [np.array(page.render(scale=dpi / 72).to_pil().convert('RGB')) for page in pdf]
+
+    try:
+        import fitz
+    except ImportError:
+        raise ImportError("Reading PDFs needs pypdfium2 or PyMuPDF: pip install pypdfium2")
+
+    pages = []
+    with fitz.open(stream=data, filetype='pdf') as doc:
+        for page in doc:
+            pixmap = page.get_pixmap(dpi=dpi)
+            pages.append(np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width, pixmap.n)[:, :, :3])
+    return pages
+
+def _group_lines(segments: List[Dict]) -> List[List[Dict]]:
+    if not segments:
+        return []
+
+    def top(segment):
+        return min(y for _, y in segment['bbox'])
+
+    def height(segment):
+        ys = [y for _, y in segment['bbox']]
+        return max(ys) - min(ys)
+
+    line_height = float(np.median([height(segment) for segment in segments])) or 1.0
+    lines = []
+    for segment in sorted(segments, key=top):
+        if lines and top(segment) - top(lines[-1][0]) < line_height / 2:
+            lines[-1].append(segment)
+        else:
+            lines.append([segment])
+    return [sorted(line, key=lambda segment: min(x for x, _ in segment['bbox'])) for line in lines]
+
+def split_problems(segments: List[Dict], review_threshold: float = 0.7) -> List[Dict]:
+    # Groups OCR segments of one page into reading-order lines and starts a new
+    # problem at every line that opens with a problem marker.
+    problems = []
+    current = {'label': None, 'segments': []}
+
+    for line in _group_lines(segments):
+        match = PROBLEM_MARKER.match(line[0]['text'])
+        if match:
+            if current['segments']:
+                problems.append(current)
+            current = {'label': match.group('named') or match.group('number') or match.group('paren'), 'segments': []}
+            line = [dict(line[0], text=line[0]['text'][match.end():])] + line[1:]
+        current['segments'].extend(segment for segment in line if segment['text'].strip())
+    if current['segments']:
+        problems.append(current)
+
+    extracts = []
+    for problem in problems:
+        confidence = float(np.mean([segment['confidence'] for segment in problem['segments']]))
+        extracts.append({
+            'label': problem['label'],
+            'text': ' '.join(segment['text'].strip() for segment in problem['segments']),
+            'confidence': confidence,
+            'needs_review': confidence < review_threshold
+        })
+    return extracts
+
+class BatchOCRProcessor:
+    # OCRs many images / multi-page PDFs across a pool of worker processes, each
+    # with its own EasyOCR reader, and streams back one extract per problem.
+    def __init__(self, workers: Optional[int] = None, ocr_options: Optional[Dict] = None, pdf_dpi: int = 200):
+        self.workers = workers or os.cpu_count() or 1
+        self.ocr_options = ocr_options or {}
+        self.pdf_dpi = pdf_dpi
+        self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            threads_per_worker = max(1, (os.cpu_count() or 1) // self.workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.ocr_options, threads_per_worker)
+            )
+        return self._pool
+
+    def extract_batch(self, sources: Iterable, split: bool = True) -> Iterator[Dict]:
+        # Yields extracts in completion order; each carries 'source' (index into
+        # sources), 'page' and, when split, the problem 'label'.
+        pool = self._get_pool()
+        futures = []
+        for source_index, source in enumerate(sources):
+            for page_index, page in enumerate(_load_pages(source, self.pdf_dpi)):
+                futures.append(pool.submit(_ocr_page, source_index, page_index, page))
+
+        for future in as_completed(futures):
+            page = future.result()
+            location = {'source': page['source'], 'page': page['page']}
+            if not split:
+                yield {**location, 'label': None, 'text': page['text'], 'confidence': page['confidence'], 'needs_review': page['needs_review']}
+                continue
+            for extract in split_problems(page['segments']):
+                yield {**location, **extract}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
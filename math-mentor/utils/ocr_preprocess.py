@@ -0,0 +1,104 @@
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Working resolution used only to measure text size, skew and extent.
+ANALYSIS_MAX_SIDE = 1200
+
+def _to_grayscale(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_RGBA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+def _text_mask(gray: np.ndarray) -> np.ndarray:
+    # Dark-on-light ink becomes white foreground; works for photos with uneven light.
+    blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+    return cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+
+def _median_text_height(mask: np.ndarray) -> Optional[float]:
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    # Ignore specks, rules and page borders when estimating glyph height.
+    keep = (areas >= 8) & (heights >= 4) & (heights <= mask.shape[0] / 4) & (widths <= mask.shape[1] / 2)
+    if count <= 1 or not keep.any():
+        return None
+    return float(np.median(heights[keep]))
+
+def _skew_angle(mask: np.ndarray) -> float:
+    coords = cv2.findNonZero(mask)
+    if coords is None or len(coords) < 50:
+        return 0.0
+    (_, _), (width, height), angle = cv2.minAreaRect(coords)
+    # Normalise OpenCV's rectangle angle to the rotation of the text baseline.
+    if width < height:
+        angle -= 90
+    if angle < -45:
+        angle += 90
+    elif angle > 45:
+        angle -= 90
+    return angle
+
+def _rotate(image: np.ndarray, angle: float) -> np.ndarray:
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+def preprocess_image(image: np.ndarray, target_text_height: int = 32, max_side: int = 2400,
+                     max_skew: float = 15.0, timings: Optional[Dict[str, float]] = None) -> Tuple[np.ndarray, Dict]:
+    # Grayscale -> downscale so text is about target_text_height px -> deskew ->
+    # crop to the text region. Never upscales, so OCR cost is bounded by the
+    # content rather than the camera resolution.
+    timings = timings if timings is not None else {}
+    info = {'original_size': image.shape[:2]}
+
+    started = time.perf_counter()
+    gray = _to_grayscale(image)
+    timings['grayscale'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    analysis_scale = min(1.0, ANALYSIS_MAX_SIDE / max(gray.shape[:2]))
+    small = cv2.resize(gray, None, fx=analysis_scale, fy=analysis_scale, interpolation=cv2.INTER_AREA) if analysis_scale < 1.0 else gray
+    small_mask = _text_mask(small)
+    text_height = _median_text_height(small_mask)
+
+    scale = min(1.0, max_side / max(gray.shape[:2]))
+    if text_height:
+        scale = min(scale, target_text_height / (text_height / analysis_scale))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    info['scale'] = scale
+    info['text_height'] = text_height / analysis_scale if text_height else None
+    timings['downscale'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    angle = _skew_angle(small_mask)
+    if 0.5 <= abs(angle) <= max_skew:
+        gray = _rotate(gray, angle)
+        small_mask = _text_mask(_rotate(small, angle))
+    else:
+        angle = 0.0
+    info['skew_angle'] = angle
+    timings['deskew'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    coords = cv2.findNonZero(small_mask)
+    if coords is not None:
+        x, y, w, h = cv2.boundingRect(coords)
+        ratio = gray.shape[0] / small_mask.shape[0]
+        margin = int(target_text_height)
+        left = max(0, int(x * ratio) - margin)
+        top = max(0, int(y * ratio) - margin)
+        right = min(gray.shape[1], int((x + w) * ratio) + margin)
+        bottom = min(gray.shape[0], int((y + h) * ratio) + margin)
+        gray = gray[top:bottom, left:right]
+        info['crop'] = (left, top, right, bottom)
+    timings['crop'] = time.perf_counter() - started
+
+    info['processed_size'] = gray.shape[:2]
+    return gray, info
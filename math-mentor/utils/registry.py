@@ -0,0 +1,131 @@
+import threading
+from typing import Any, Callable, Dict, Iterable
+
+class ResourceRegistry:
+    # Process-wide, lazily built singletons. Each resource has its own lock so a
+    # slow model load (Whisper, EasyOCR) never blocks access to unrelated ones.
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._warming = set()
+
+    def register(self, name: str, factory: Callable[[], Any], replace: bool = False):
+        with self._lock:
+            if name in self._factories and not replace:
+                return
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+            if replace:
+                self._instances.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        if name in self._instances:
+            return self._instances[name]
+
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Unknown resource: {name}")
+            lock = self._locks[name]
+
+        with lock:
+            if name not in self._instances:
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def warm_up(self, names: Iterable[str]) -> threading.Thread:
+        # Builds resources (and loads their models) on a daemon thread so the UI
+        # can render first. A request that needs one while it is still loading
+        # waits on the same per-resource lock instead of loading it twice.
+        with self._lock:
+            names = [name for name in names if name not in self._warming]
+            self._warming.update(names)
+
+        def run():
+            for name in names:
+                try:
+                    resource = self.get(name)
+                    if hasattr(resource, 'load'):
+                        resource.load()
+                except Exception as e:
+                    print(f"Warm-up of {name} failed: {e}")
+
+        thread = threading.Thread(target=run, name='registry-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def reset(self, name: str = None):
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+registry = ResourceRegistry()
+
+# Factories import their modules on first use, so importing the registry (and
+# the app) does not pull in torch, Whisper, EasyOCR, Chroma or Gemini.
+def _memory():
+    from utils.memory import MemorySystem
+    return MemorySystem()
+
+def _ocr():
+    from utils.ocr import OCRProcessor
+    return OCRProcessor()
+
+def _ocr_batch():
+    from utils.ocr_batch import BatchOCRProcessor
+    return BatchOCRProcessor()
+
+def _audio():
+    from utils.audio import AudioProcessor
+    return AudioProcessor()
+
+def _media_cache():
+    from utils.media_cache import create_media_cache
+    return create_media_cache()
+
+def _parser():
+    from agents.parser import ParserAgent
+    return ParserAgent()
+
+def _router():
+    from agents.router import RouterAgent
+    return RouterAgent()
+
+def _solver():
+    from agents.solver import SolverAgent
+    return SolverAgent()
+
+def _verifier():
+    from agents.verifier import VerifierAgent
+    return VerifierAgent()
+
+def _explainer():
+    from agents.explainer import ExplainerAgent
+    return ExplainerAgent()
+
+def _fused_solver():
+    from agents.fused import FusedSolverAgent
+    return FusedSolverAgent(registry.get('solver'))
+
+def _retriever():
+    from rag.retriever import Retriever
+    return Retriever(memory=registry.get('memory'))
+
+registry.register('memory', _memory)
+registry.register('ocr', _ocr)
+registry.register('ocr_batch', _ocr_batch)
+registry.register('audio', _audio)
+registry.register('media_cache', _media_cache)
+registry.register('parser', _parser)
+registry.register('router', _router)
+registry.register('solver', _solver)
+registry.register('verifier', _verifier)
+registry.register('explainer', _explainer)
+registry.register('fused_solver', _fused_solver)
+registry.register('retriever', _retriever)
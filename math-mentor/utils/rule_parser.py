@@ -0,0 +1,155 @@
+import re
+from typing import Dict, List, Optional
+
+from utils.math_engine import NotSolvable, get_math_engine, normalize_problem, parse_equations, parse_expression
+from utils.text_index import math_tokenize
+
+# Below this the parse is handed to the LLM.
+CONFIDENCE_THRESHOLD = 0.8
+
+TOPIC_KEYWORDS = {
+    'calculus': {
+        'derivative', 'derivatives', 'differentiate', 'differentiation', 'integral', 'integrals', 'integrate',
+        'integration', 'limit', 'lim', 'd/dx', 'd/dt', 'tangent', 'slope', 'maxima', 'minima', 'maximum',
+        'minimum', 'extremum', 'concave', 'inflection', 'antiderivative', 'continuous', 'differentiable',
+    },
+    'linear_algebra': {
+        'matrix', 'matrices', 'determinant', 'det', 'inverse', 'transpose', 'eigenvalue', 'eigenvalues',
+        'eigenvector', 'eigenvectors', 'rank', 'vector', 'vectors', 'span', 'basis', 'orthogonal', 'trace',
+    },
+    'probability': {
+        'probability', 'probabilities', 'chance', 'dice', 'die', 'coin', 'coins', 'card', 'cards', 'deck',
+        'random', 'expected', 'expectation', 'variance', 'odds', 'heads', 'tails', 'combinations',
+        'permutations', 'choose', 'ways', 'binomial', 'comb', 'perm', 'ncr', 'npr', 'independent', 'outcomes',
+    },
+    'algebra': {
+        'solve', 'equation', 'equations', 'factor', 'factorise', 'factorize', 'simplify', 'expand', 'roots',
+        'root', 'polynomial', 'quadratic', 'linear', 'inequality', 'system', 'zeros', 'solutions',
+    },
+}
+ALL_KEYWORDS = set().union(*TOPIC_KEYWORDS.values())
+TASK_TOPICS = {
+    'equation': 'algebra', 'system': 'algebra', 'factor': 'algebra', 'expand': 'algebra', 'simplify': 'algebra',
+    'derivative': 'calculus', 'integral': 'calculus', 'limit': 'calculus',
+    'determinant': 'linear_algebra', 'inverse': 'linear_algebra', 'transpose': 'linear_algebra',
+    'rank': 'linear_algebra',
+}
+# Words that may appear in a "well-formed" problem without making it a word problem.
+COMMAND_WORDS = {
+    'solve', 'find', 'for', 'the', 'of', 'compute', 'calculate', 'evaluate', 'determine', 'what', 'is',
+    'simplify', 'factor', 'factorise', 'factorize', 'expand', 'derivative', 'differentiate', 'integral',
+    'integrate', 'limit', 'lim', 'as', 'approaches', 'from', 'to', 'with', 'respect', 'wrt', 'if', 'then',
+    'given', 'where', 'and', 'matrix', 'determinant', 'det', 'inverse', 'transpose', 'rank', 'second',
+    'first', 'third', 'value', 'equation', 'system', 'equations', 'definite', 'indefinite', 'please', 'let',
+    'sin', 'cos', 'tan', 'sec', 'csc', 'cot', 'asin', 'acos', 'atan', 'arcsin', 'arccos', 'arctan', 'sinh',
+    'cosh', 'tanh', 'exp', 'log', 'ln', 'sqrt', 'abs', 'pi', 'oo', 'infinity', 'factorial', 'binomial',
+    'comb', 'perm', 'ncr', 'npr', 'dx', 'dy', 'dt', 'such', 'that', 'when',
+}
+MATH_CHARACTERS = set("0123456789+-*/^=<>()[]|'²³√∫")
+# Lowercase only: capitals are events, random variables and matrices (P(A), E(X), det(A)).
+SINGLE_LETTER = re.compile(r'(?<![A-Za-z_])[a-z](?![A-Za-z_])')
+# P(A), P(A|B), Pr(A), E(X), Var(X).
+PROBABILITY_NOTATION = re.compile(r'\b(?:P|Pr|E|Var|Cov)\s*\(|\([^()|]*\|[^()|]*\)')
+CONSTRAINT = re.compile(
+    r'\b(?:where|given(?:\s+that)?|such\s+that|with|for|if|assuming)\s+'
+    r'(?P<constraint>[^,;.]*?(?:>=|<=|!=|[<>≤≥≠])[^,;]*?)(?=\s*(?:[,;]|\.\s|\.?$|\band\b))', re.I)
+INEQUALITY = re.compile(r'>=|<=|!=|[<>≤≥≠]')
+
+class RuleBasedParser:
+    # Local first hop for ParserAgent: tokenises math syntax, picks out variables
+    # and constraints, and infers the topic from operators and keywords. parse()
+    # returns a result with a confidence; ParserAgent uses it when the confidence
+    # clears CONFIDENCE_THRESHOLD and otherwise asks the LLM.
+    def parse(self, raw_text: str) -> Optional[Dict]:
+        text = re.sub(r'\s+', ' ', raw_text or '').strip()
+        if not text:
+            return None
+
+        tokens = math_tokenize(text)
+        words = [token for token in tokens if token.isalpha() and len(token) > 1]
+        prose = [word for word in words if word not in COMMAND_WORDS and word not in ALL_KEYWORDS]
+        variables = self._variables(text)
+        constraints = self._constraints(text)
+
+        scores = {topic: sum(token in keywords for token in tokens) for topic, keywords in TOPIC_KEYWORDS.items()}
+        if "'" in text and re.search(r"[a-z]'+\s*\(", text):
+            scores['calculus'] += 1
+        if '∫' in text or re.search(r'd\s*/\s*d[a-z]', text):
+            scores['calculus'] += 2
+        if re.search(r'\[\s*\[|\[[^\]]*;', text):
+            scores['linear_algebra'] += 2
+        if re.search(r'\d\s*!|\b\d+\s*[CP]\s*\d+\b', text):
+            scores['probability'] += 2
+        if PROBABILITY_NOTATION.search(text):
+            scores['probability'] += 3
+        if '=' in text or INEQUALITY.search(text):
+            scores['algebra'] += 1
+
+        # The math engine's verdict doubles as a well-formedness check; its result
+        # is memoised, so the router and solver reuse this computation.
+        solved = get_math_engine().solve({'problem_text': text, 'variables': variables})
+        if solved is not None and solved['task'] in TASK_TOPICS:
+            scores[TASK_TOPICS[solved['task']]] += 3
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (topic, best), (_, runner_up) = ranked[0], ranked[1]
+        if best == 0:
+            return None
+
+        if solved is not None:
+            confidence = 0.95
+        elif not prose and (variables or re.search(r'\d', text)) and any(c in MATH_CHARACTERS for c in text):
+            # A bare formula with a clear topic, if the engine can at least read it;
+            # otherwise it is notation the rules do not understand.
+            confidence = 0.85 if self._parses(text, variables) else 0.7
+        else:
+            # Word problem: keywords alone are a weak signal.
+            confidence = min(0.7, 0.4 + 0.1 * best)
+        if best == runner_up:
+            confidence = min(confidence, 0.6)
+
+        return {
+            'problem_text': text,
+            'topic': topic,
+            'variables': variables,
+            'constraints': constraints,
+            'needs_clarification': False,
+            'parser_confidence': round(confidence, 2)
+        }
+
+    def _variables(self, text: str) -> List[str]:
+        # A single letter counts as a variable next to a digit or operator: "3x",
+        # "x^2", "x + y". "a" in "a fair coin", f in "f(x)", e in "e^x" and the d
+        # of d/dx do not.
+        text = re.sub(r'\bd\s*/\s*d(?=[a-z])', ' ', text)
+        text = re.sub(r'\b(\d+)\s*[CP]\s*(\d+)\b', r'\1 \2', text)
+        found = []
+        for match in SINGLE_LETTER.finditer(text):
+            letter = match.group()
+            before = text[:match.start()].rstrip()[-1:]
+            after = text[match.end():].lstrip()[:1]
+            if letter == 'e' and after == '^':
+                continue
+            if re.match(r"'+\s*\(", text[match.end():]):
+                continue
+            if after == '(' and re.match(r'\s*\(\s*[a-z0-9]', text[match.end():]) and not before.isdigit():
+                continue
+            if (before and before in MATH_CHARACTERS) or (after and after in MATH_CHARACTERS):
+                if letter not in found:
+                    found.append(letter)
+        return found
+
+    def _parses(self, text: str, variables: List[str]) -> bool:
+        body = normalize_problem(CONSTRAINT.sub('', text)).strip(' ,;')
+        try:
+            if parse_equations(body, tuple(variables)) is not None:
+                return True
+            # Equations the engine does not solve (more unknowns than equations)
+            # still count when every side is a valid expression.
+            return all(parse_expression(side, tuple(variables)) is not None
+                       for side in re.split(r'\s*[=,;]\s*', body) if side)
+        except NotSolvable:
+            return False
+
+    def _constraints(self, text: str) -> List[str]:
+        return [match.group('constraint').strip() for match in CONSTRAINT.finditer(text)]
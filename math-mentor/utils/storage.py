@@ -0,0 +1,200 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+@contextmanager
+def file_lock(lock_path: str, timeout: float = 10.0):
+    # Exclusive inter-process lock held on a sidecar file.
+    with open(lock_path, 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"Could not lock {lock_path}")
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+class MemoryStorage:
+    def load(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def append(self, entry: Dict) -> List[Dict]:
+        # Persists entry (assigning its 'id') and returns every entry that became
+        # visible since the last load/append/read_new call, ending with entry.
+        raise NotImplementedError
+
+    def read_new(self) -> List[Dict]:
+        return []
+
+class JSONFileStorage(MemoryStorage):
+    # Legacy single-document format: every append rewrites the whole file.
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._entries: List[Dict] = []
+
+    def load(self) -> List[Dict]:
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self._entries = json.load(f)
+        return list(self._entries)
+
+    def append(self, entry: Dict) -> List[Dict]:
+        with file_lock(self.lock_path):
+            entry['id'] = len(self._entries)
+            self._entries.append(entry)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+        return [entry]
+
+class JSONLStorage(MemoryStorage):
+    # Append-only log, one JSON entry per line. Writers take an inter-process lock,
+    # pick up anything other processes appended, then append a single line, so a
+    # write costs the same regardless of how much history the log holds.
+    # Entries are never updated or deleted, so the log holds no superseded lines
+    # to compact away; the only dead lines are ones a crashed writer left behind,
+    # and load() rewrites the log once more than compact_threshold of those pile up.
+    def __init__(self, path: str, legacy_path: Optional[str] = None, compact_threshold: int = 100):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.legacy_path = legacy_path
+        self.compact_threshold = compact_threshold
+        self._offset = 0
+        self._count = 0
+        self._next_id = 0
+        self._file_id = None
+
+    def load(self) -> List[Dict]:
+        with file_lock(self.lock_path):
+            if not os.path.exists(self.path):
+                self._migrate_legacy()
+            self._offset = 0
+            self._count = 0
+            entries, garbage = self._read_from_offset()
+            if garbage > self.compact_threshold:
+                self._rewrite(entries)
+        return entries
+
+    def append(self, entry: Dict) -> List[Dict]:
+        with file_lock(self.lock_path):
+            new_entries, _ = self._read_from_offset()
+            entry['id'] = self._next_id
+            line = json.dumps(entry) + '\n'
+
+            with open(self.path, 'ab') as f:
+                if f.tell() > self._offset:
+                    # A crashed writer left a partial line; terminate it so ours parses.
+                    line = '\n' + line
+                f.write(line.encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+                self._offset = f.tell()
+
+            self._file_id = self._stat_id()
+            self._count += 1
+            self._next_id += 1
+        return new_entries + [entry]
+
+    def read_new(self) -> List[Dict]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if (stat.st_ino, stat.st_dev) == self._file_id and stat.st_size == self._offset:
+            return []
+        with file_lock(self.lock_path):
+            entries, _ = self._read_from_offset()
+        return entries
+
+    def _stat_id(self):
+        stat = os.stat(self.path)
+        return (stat.st_ino, stat.st_dev)
+
+    def _read_from_offset(self):
+        # Caller holds the lock. Returns entries not yet seen by this process and
+        # the number of unusable (corrupt or superseded) lines encountered.
+        if not os.path.exists(self.path):
+            return [], 0
+
+        skip = 0
+        if self._file_id is not None and self._stat_id() != self._file_id:
+            # Another process compacted the log; valid entries keep their order,
+            # so re-read from the start and skip the ones already delivered.
+            skip = self._count
+            self._offset = 0
+            self._count = 0
+
+        entries = []
+        seen_ids = set()
+        garbage = 0
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            for raw_line in f:
+                if not raw_line.endswith(b'\n'):
+                    break
+                self._offset += len(raw_line)
+                if not raw_line.strip():
+                    continue
+                try:
+                    entry = json.loads(raw_line)
+                except json.JSONDecodeError:
+                    garbage += 1
+                    continue
+                if entry.get('id') in seen_ids:
+                    garbage += 1
+                    continue
+                seen_ids.add(entry.get('id'))
+                entries.append(entry)
+                self._next_id = max(self._next_id, entry.get('id', -1) + 1)
+
+        self._file_id = self._stat_id()
+        self._count += len(entries)
+        return entries[skip:], garbage
+
+    def _rewrite(self, entries: List[Dict]):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for entry in entries:
+                f.write((json.dumps(entry) + '\n').encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._offset = os.path.getsize(self.path)
+        self._file_id = self._stat_id()
+
+    def _migrate_legacy(self):
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            with open(self.legacy_path, 'r') as f:
+                legacy_entries = json.load(f)
+            for i, entry in enumerate(legacy_entries):
+                entry.setdefault('id', i)
+            self._rewrite(legacy_entries)
+
+def open_storage(path: str) -> MemoryStorage:
+    if path.endswith('.json'):
+        return JSONFileStorage(path)
+    return JSONLStorage(path, legacy_path=os.path.splitext(path)[0] + '.json')
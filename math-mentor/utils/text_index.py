@@ -0,0 +1,106 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+# Spelled-out forms so "√" matches "sqrt", "b²" matches "b^2", and so on.
+SYMBOL_WORDS = {
+    '√': ' sqrt ', '∫': ' integral ', '∑': ' sum ', 'Σ': ' sum ', 'σ': ' sigma ', 'π': ' pi ', '∞': ' infinity ',
+    '→': ' -> ', '±': ' +- ', '≤': ' <= ', '≥': ' >= ', '≠': ' != ', '×': ' * ', '·': ' * ', '÷': ' / ',
+    '−': '-', '²': '^2', '³': '^3', 'ⁿ': '^n', 'ᵀ': '^t', '⁻¹': '^-1',
+}
+# Notation kept whole as well as split: d/dx, P(A|B), f(x), x^2, f'.
+MATH_COMPOUND = re.compile(r"d\s*/\s*d[a-z]|(?<![a-z])[a-z]\(\s*[a-z]\s*(?:[|,]\s*[a-z]\s*)?\)|[a-z]\^-?[\da-z]+|[a-z]'+")
+# Words that say nothing about which document a query is after.
+STOPWORDS = {
+    'a', 'an', 'the', 'of', 'to', 'in', 'on', 'at', 'by', 'for', 'from', 'with', 'and', 'or', 'is', 'are',
+    'be', 'it', 'its', 'this', 'that', 'if', 'then', 'as', 'what', 'which', 'find', 'given', 'let', 'how',
+    'when', 'where', 'do', 'does', 'can', 'we', 'you', 'i',
+}
+MATH_TOKEN = re.compile(r"[^\W\d_]+|\d+(?:\.\d+)?|[-+*/^=<>|!]")
+
+def whitespace_tokenize(text: str) -> List[str]:
+    return text.lower().split()
+
+def math_tokenize(text: str) -> List[str]:
+    # Symbols first: lowercasing would turn the summation sign Σ into σ.
+    for symbol, word in SYMBOL_WORDS.items():
+        text = text.replace(symbol, word)
+    text = text.lower()
+    compounds = [re.sub(r'\s+', '', match) for match in MATH_COMPOUND.findall(text)]
+    return compounds + MATH_TOKEN.findall(text)
+
+class InvertedIndex:
+    # BM25 inverted index partitioned by an optional key (e.g. topic). Queries only
+    # touch the posting lists of their own tokens, never the whole corpus.
+    def __init__(self, tokenizer: Callable[[str], List[str]] = whitespace_tokenize, k1: float = 1.5, b: float = 0.75,
+                 stopwords: Optional[Set[str]] = None):
+        self.tokenizer = tokenizer
+        # With stopwords, coverage counts only content tokens: not stopwords and
+        # not single characters.
+        self.stopwords = stopwords
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, Dict[Hashable, int]]] = defaultdict(lambda: defaultdict(dict))
+        self._doc_lengths: Dict[str, Dict[Hashable, int]] = defaultdict(dict)
+        self._total_lengths: Dict[str, int] = defaultdict(int)
+
+    def __len__(self) -> int:
+        return sum(len(lengths) for lengths in self._doc_lengths.values())
+
+    def add(self, doc_id: Hashable, text: str, partition: str = ''):
+        tokens = self.tokenizer(text)
+        postings = self._postings[partition]
+        for token, tf in Counter(tokens).items():
+            postings[token][doc_id] = tf
+        self._doc_lengths[partition][doc_id] = len(tokens)
+        self._total_lengths[partition] += len(tokens)
+
+    def search(self, query: str, partition: Optional[str] = None, limit: Optional[int] = None) -> List[Tuple[Hashable, float, float]]:
+        # Returns (doc_id, bm25_score, coverage) where coverage is the fraction of
+        # distinct query tokens (content tokens, with stopwords) in the document.
+        return self.search_many([query], [partition], limit)[0]
+
+    def search_many(self, queries: List[str], partitions: List[Optional[str]],
+                    limit: Optional[int] = None) -> List[List[Tuple[Hashable, float, float]]]:
+        # Scores a batch in one pass: each (partition, token) posting list is read
+        # and weighted once, however many queries in the batch contain the token.
+        query_tokens = [set(self.tokenizer(query)) for query in queries]
+        content_tokens = [self._content(tokens) for tokens in query_tokens]
+        wanted: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        for position, (tokens, partition) in enumerate(zip(query_tokens, partitions)):
+            for part in ([partition] if partition is not None else list(self._doc_lengths)):
+                for token in tokens:
+                    wanted[(part, token)].append(position)
+
+        scores: List[Dict[Hashable, float]] = [defaultdict(float) for _ in queries]
+        matched: List[Dict[Hashable, int]] = [defaultdict(int) for _ in queries]
+        for (part, token), positions in wanted.items():
+            doc_lengths = self._doc_lengths.get(part)
+            docs = self._postings[part].get(token) if doc_lengths else None
+            if not docs:
+                continue
+            n_docs = len(doc_lengths)
+            avg_length = self._total_lengths[part] / n_docs or 1.0
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            weights = [
+                (doc_id, idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * doc_lengths[doc_id] / avg_length)))
+                for doc_id, tf in docs.items()
+            ]
+            for position in positions:
+                for doc_id, weight in weights:
+                    scores[position][doc_id] += weight
+                    if token in content_tokens[position]:
+                        matched[position][doc_id] += 1
+
+        batch = []
+        for tokens, query_scores, query_matched in zip(content_tokens, scores, matched):
+            results = [(doc_id, score, query_matched[doc_id] / (len(tokens) or 1)) for doc_id, score in query_scores.items()]
+            results.sort(key=lambda r: r[1], reverse=True)
+            batch.append(results[:limit] if limit is not None else results)
+        return batch
+
+    def _content(self, tokens: Set[str]) -> Set[str]:
+        if self.stopwords is None:
+            return tokens
+        return {token for token in tokens if len(token) > 1 and token not in self.stopwords}